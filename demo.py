@@ -1,34 +1,56 @@
-from main import main
+import uuid
+from typing import Iterator
+from main import SessionManager
 import streamlit as st
 
+@st.cache_resource
+def get_session_manager() -> SessionManager:
+    return SessionManager()
+
+def wait_for_first_token(msg_stream : Iterator[str]) -> Iterator[str]:
+    with st.spinner("Finding out for you... 😊"):
+        first_msg_delta = next(msg_stream, "")
+    yield first_msg_delta
+    yield from msg_stream
+
 st.title("Psychology Blossom Assistant")
 
-if "messages" not in st.session_state:
+session_manager : SessionManager = get_session_manager()
+
+def reset_conversation() -> None:
     st.session_state["messages"] = [
         {
             "role" : "assistant", 
             "content" : "Thank you for contacting Psychology Blossom! How can I help you?"
         }
     ]
-    st.session_state["main"] = main()
+    st.session_state["session_id"] = str(uuid.uuid4())
+
+if "messages" not in st.session_state:
+    reset_conversation()
+elif session_manager.consume_expiry(st.session_state.session_id):
+    reset_conversation()
+    st.info(
+        "Your previous conversation ended after a period of inactivity, "
+        "so we have started a new one for you."
+    )
 
 for msg in st.session_state.messages:
     st.chat_message(msg["role"]).write(msg["content"])
 
-main_app : main = st.session_state.main
+session_id : str = st.session_state.session_id
 messages : list[dict] = st.session_state.messages
 
 if prompt := st.chat_input():
     messages.append({"role" : "user", "content" : prompt})
     st.chat_message("user").write(prompt)
-    with st.spinner("Finding out for you... 😊"):
-        msg = main_app.chat(prompt)
+    with st.chat_message("assistant"):
+        msg = st.write_stream(wait_for_first_token(session_manager.chat_stream(session_id, prompt)))
     messages.append({"role" : "assistant", "content" : msg})
-    st.chat_message("assistant").write(msg)
 
 with st.sidebar:
     st.image(image = "resources/logo.png")
-    costs = main_app.get_new_costs()
+    costs = session_manager.get_new_costs(session_id)
     st.metric(
         "Embedding model costs", 
         f"${costs.get("embed_cost"):.6f}", 
@@ -47,3 +69,16 @@ with st.sidebar:
         f"{costs.get("gpt_4o_mini_diff"):.6f}",
         delta_color = "off"
     )
+    st.metric(
+        "Embedding cache hits", 
+        f"{costs.get("embed_cache_hits")}", 
+        f"{costs.get("embed_cache_misses")} misses",
+        delta_color = "off"
+    )
+    metrics = session_manager.get_metrics()
+    st.metric(
+        "Preference LLM fallback rate", 
+        f"{metrics.get("preference_fallback_rate"):.0%}", 
+        f"{metrics.get("preference_fast_path")} resolved locally",
+        delta_color = "off"
+    )
@@ -1,34 +1,90 @@
 import json
 from systems.vectorstore import VectorstoreManager
-from systems.model.model import Messages, ChatModel
+from systems.model.model import (
+    Messages, ChatModel, AsyncChatModel, EmbeddingModel, AsyncEmbeddingModel, TokenUsage
+)
 
 class RAG:
-    messages : Messages
     chat_model : ChatModel
     vectorstore_manager : VectorstoreManager
+    embedding_model : EmbeddingModel | None
+    async_chat_model : AsyncChatModel | None
+    async_embedding_model : AsyncEmbeddingModel | None
 
     def __init__(
             self, 
-            messages : Messages,
             chat_model : ChatModel, 
-            vectorstore_manager : VectorstoreManager
+            vectorstore_manager : VectorstoreManager,
+            embedding_model : EmbeddingModel = None,
+            async_chat_model : AsyncChatModel = None,
+            async_embedding_model : AsyncEmbeddingModel = None
             ) -> None:
-        self.messages = messages
         self.chat_model = chat_model
         self.vectorstore_manager = vectorstore_manager
+        self.embedding_model = embedding_model
+        self.async_chat_model = async_chat_model
+        self.async_embedding_model = async_embedding_model
     
-    def main(self, **kwargs) -> str:
-        ori_sys_prompt = self.messages.get_sys_prompt()
-        self.messages.update_sys_prompt(sys_prompt = self.rephrase_question_prompt)
+    def main(
+            self, 
+            messages : Messages, 
+            token_usage : TokenUsage = None, 
+            **kwargs
+            ) -> str:
+        if (context := self.__get_standalone_context(messages)):
+            return json.dumps(context)
         rephrased_question = self.chat_model.get_response(
-            messages = self.messages,
+            messages = messages.fork(sys_prompt = self.rephrase_question_prompt),
+            model = "gpt-4o-mini",
+            record_response = False,
+            token_usage = token_usage
+        )
+        if (context := self.vectorstore_manager.get_lexical_context(rephrased_question)):
+            return json.dumps(context)
+        context = self.vectorstore_manager.get_context(
+            query = rephrased_question,
+            embedding_model = self.embedding_model,
+            token_usage = token_usage
+        )
+        return json.dumps(context)
+
+    async def amain(
+            self, 
+            messages : Messages, 
+            token_usage : TokenUsage = None, 
+            **kwargs
+            ) -> str:
+        if (context := self.__get_standalone_context(messages)):
+            return json.dumps(context)
+        rephrased_question = await self.async_chat_model.get_response(
+            messages = messages.fork(sys_prompt = self.rephrase_question_prompt),
             model = "gpt-4o-mini",
-            record_response = False
+            record_response = False,
+            token_usage = token_usage
+        )
+        if (context := self.vectorstore_manager.get_lexical_context(rephrased_question)):
+            return json.dumps(context)
+        context = await self.vectorstore_manager.aget_context(
+            query = rephrased_question,
+            embedding_model = self.async_embedding_model,
+            token_usage = token_usage
         )
-        context = self.vectorstore_manager.get_context(query = rephrased_question)
-        self.messages.update_sys_prompt(sys_prompt = ori_sys_prompt)
         return json.dumps(context)
 
+    def __get_standalone_context(self, messages : Messages) -> dict[str : str] | None:
+        if not self.__is_standalone(messages):
+            return None
+        return self.vectorstore_manager.get_lexical_context(messages.get_latest_user_message())
+
+    def __is_standalone(self, messages : Messages) -> bool:
+        if messages.get_summary() is not None:
+            return False
+        user_messages = [
+            message for message in messages.get_convo_messages() 
+            if message.get("role") == "user"
+        ]
+        return len(user_messages) == 1
+
     rephrase_question_prompt : str = \
     "Given a chat history and the latest user question " \
     "which might reference context in the chat history, " \
@@ -1,19 +1,13 @@
-from systems.model.model import ChatModel, EmbeddingModel
+from systems.model.model import TokenUsage
 
 class CostTracker:
-    chat_model : ChatModel
-    embedding_model : EmbeddingModel
+    token_usage : TokenUsage
     embed_cost : float = 0
     gpt_4o_cost : float = 0
     gpt_4o_mini_cost : float = 0
 
-    def __init__(
-            self, 
-            chat_model : ChatModel, 
-            embedding_model : EmbeddingModel
-            ) -> None:
-        self.chat_model = chat_model
-        self.embedding_model = embedding_model
+    def __init__(self, token_usage : TokenUsage) -> None:
+        self.token_usage = token_usage
     
     def update_costs(self) -> dict[str : float]:
         embed_cost, embed_diff = self.__get_embedding_costs()
@@ -25,17 +19,25 @@ class CostTracker:
             "gpt_4o_cost" : gpt_4o_cost,
             "gpt_4o_diff" : gpt_4o_diff,
             "gpt_4o_mini_cost" : gpt_4o_mini_cost,
-            "gpt_4o_mini_diff" : gpt_4o_mini_diff
+            "gpt_4o_mini_diff" : gpt_4o_mini_diff,
+            **self.__get_embedding_cache_stats()
         }
     
     def __get_embedding_costs(self) -> tuple[float]:
-        new_embed_cost = self.embedding_model.get_cost()
+        new_embed_cost = self.token_usage.get_embed_cost()
         embed_diff = new_embed_cost - self.embed_cost
         self.embed_cost = new_embed_cost
         return new_embed_cost, embed_diff
     
+    def __get_embedding_cache_stats(self) -> dict[str : int]:
+        cache_stats = self.token_usage.get_embed_cache_stats()
+        return {
+            "embed_cache_hits" : cache_stats.get("hits"),
+            "embed_cache_misses" : cache_stats.get("misses")
+        }
+    
     def __get_gpt_costs(self) -> tuple[float]:
-        new_costs = self.chat_model.get_cost()
+        new_costs = self.token_usage.get_chat_cost()
 
         new_gpt_4o_cost = new_costs.get("in-gpt-4o") + \
         new_costs.get("out-gpt-4o")
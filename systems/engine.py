@@ -0,0 +1,105 @@
+from systems.RAG import RAG
+from systems.refer import Refer
+from systems.therapists import Therapists
+from systems.summariser import Summariser
+from systems.filtering_agent import FilteringAgent
+from systems.reload_service import ReloadService
+from systems.response_cache import ResponseCache
+from systems.vectorstore import VectorstoreManager
+from systems.model.model import ChatModel, AsyncChatModel, EmbeddingModel, AsyncEmbeddingModel
+from systems.model.embedding_cache import EmbeddingCache
+
+class Engine:
+    embedding_cache : EmbeddingCache
+    embedding_model : EmbeddingModel
+    async_embedding_model : AsyncEmbeddingModel
+    vectorstore_manager : VectorstoreManager
+    therapists : Therapists
+    response_cache : ResponseCache | None
+    reload_service : ReloadService | None
+    chat_model : ChatModel
+    async_chat_model : AsyncChatModel
+    rag : RAG
+    filtering_agent : FilteringAgent
+    summariser : Summariser
+    refer : Refer
+
+    def __init__(
+            self, 
+            use_response_cache : bool = False, 
+            watch_files : bool = False
+            ) -> None:
+        self.embedding_cache = EmbeddingCache(
+            EmbeddingModel.model_name,
+            EmbeddingModel.dimensions
+        )
+        self.embedding_model = EmbeddingModel(cache = self.embedding_cache)
+        self.async_embedding_model = AsyncEmbeddingModel(cache = self.embedding_cache)
+        self.vectorstore_manager = VectorstoreManager(self.embedding_model)
+        self.therapists = Therapists()
+        self.response_cache = None
+        if use_response_cache:
+            self.response_cache = ResponseCache(
+                self.embedding_model, 
+                async_embedding_model = self.async_embedding_model
+            )
+        self.vectorstore_manager.update_vectorstore()
+        self.chat_model = ChatModel()
+        self.async_chat_model = AsyncChatModel()
+        self.rag = RAG(
+            self.chat_model, 
+            self.vectorstore_manager, 
+            self.embedding_model,
+            self.async_chat_model,
+            self.async_embedding_model
+        )
+        self.filtering_agent = FilteringAgent(self.chat_model, async_chat_model = self.async_chat_model)
+        self.summariser = Summariser(self.chat_model, self.async_chat_model)
+        self.refer = Refer()
+        self.reload_service = None
+        if watch_files:
+            self.reload_service = ReloadService({
+                "therapists.json" : self.reload_therapists,
+                "FAQs.json" : self.vectorstore_manager.update_vectorstore
+            })
+            self.reload_service.start()
+
+    def get_embedding_model(self) -> EmbeddingModel:
+        return self.embedding_model
+
+    def get_async_embedding_model(self) -> AsyncEmbeddingModel:
+        return self.async_embedding_model
+
+    def get_vectorstore_manager(self) -> VectorstoreManager:
+        return self.vectorstore_manager
+
+    def get_therapists(self) -> Therapists:
+        return self.therapists
+
+    def reload_therapists(self) -> None:
+        self.therapists = Therapists()
+
+    def close(self) -> None:
+        if self.reload_service is not None:
+            self.reload_service.stop()
+
+    def get_response_cache(self) -> ResponseCache | None:
+        return self.response_cache
+
+    def get_chat_model(self) -> ChatModel:
+        return self.chat_model
+
+    def get_async_chat_model(self) -> AsyncChatModel:
+        return self.async_chat_model
+
+    def get_rag(self) -> RAG:
+        return self.rag
+
+    def get_filtering_agent(self) -> FilteringAgent:
+        return self.filtering_agent
+
+    def get_summariser(self) -> Summariser:
+        return self.summariser
+
+    def get_refer(self) -> Refer:
+        return self.refer
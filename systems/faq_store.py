@@ -0,0 +1,95 @@
+import os
+import mmap
+import hashlib
+import numpy as np
+
+class FaqStore:
+    offsets : np.ndarray
+    hashes : np.ndarray
+    blob : mmap.mmap | bytes
+    hash_size : int = 20
+
+    def __init__(self, offsets : np.ndarray, hashes : np.ndarray, blob : mmap.mmap | bytes) -> None:
+        self.offsets = offsets
+        self.hashes = hashes
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.offsets[:, 0] >= 0))
+
+    @classmethod
+    def get_hash(cls, text : str | None) -> bytes:
+        return hashlib.sha1(cls.normalise(text).encode("utf-8")).digest()
+
+    @classmethod
+    def normalise(cls, text : str | None) -> str:
+        return "" if text is None else str(text)
+
+    @classmethod
+    def get_empty(cls) -> "FaqStore":
+        return cls.from_entries(dict(), 0)
+
+    @classmethod
+    def from_entries(cls, entries : dict[int : tuple[str, str]], capacity : int) -> "FaqStore":
+        offsets = np.full((capacity, 4), -1, dtype = np.int64)
+        hashes = np.zeros((capacity, 2 * cls.hash_size), dtype = np.uint8)
+        chunks = list()
+        position = 0
+        for id, (question, answer) in sorted(entries.items()):
+            question_bytes = cls.normalise(question).encode("utf-8")
+            answer_bytes = cls.normalise(answer).encode("utf-8")
+            offsets[id] = (
+                position,
+                position + len(question_bytes),
+                position + len(question_bytes),
+                position + len(question_bytes) + len(answer_bytes)
+            )
+            hashes[id] = np.frombuffer(cls.get_hash(question) + cls.get_hash(answer), dtype = np.uint8)
+            chunks.extend((question_bytes, answer_bytes))
+            position += len(question_bytes) + len(answer_bytes)
+        return cls(offsets, hashes, b"".join(chunks))
+
+    @classmethod
+    def load(cls, path_prefix : str) -> "FaqStore":
+        offsets = np.load(f"{path_prefix}.offsets.npy", mmap_mode = "r")
+        hashes = np.load(f"{path_prefix}.hashes.npy", mmap_mode = "r")
+        with open(f"{path_prefix}.blob", "rb") as blob_file:
+            if os.fstat(blob_file.fileno()).st_size == 0:
+                blob = b""
+            else:
+                blob = mmap.mmap(blob_file.fileno(), 0, access = mmap.ACCESS_READ)
+        return cls(offsets, hashes, blob)
+
+    def save(self, path_prefix : str) -> None:
+        for suffix, array in (("offsets.npy", self.offsets), ("hashes.npy", self.hashes)):
+            with open(f"{path_prefix}.{suffix}.tmp", "wb") as array_file:
+                np.save(array_file, np.asarray(array))
+                array_file.flush()
+                os.fsync(array_file.fileno())
+            os.replace(f"{path_prefix}.{suffix}.tmp", f"{path_prefix}.{suffix}")
+        with open(f"{path_prefix}.blob.tmp", "wb") as blob_file:
+            blob_file.write(self.blob)
+            blob_file.flush()
+            os.fsync(blob_file.fileno())
+        os.replace(f"{path_prefix}.blob.tmp", f"{path_prefix}.blob")
+
+    def get(self, id : int) -> tuple[str, str] | None:
+        if not 0 <= id < len(self.offsets):
+            return None
+        question_start, question_end, answer_start, answer_end = self.offsets[id].tolist()
+        if question_start < 0:
+            return None
+        return (
+            self.blob[question_start:question_end].decode("utf-8"),
+            self.blob[answer_start:answer_end].decode("utf-8")
+        )
+
+    def get_hashes(self, id : int) -> tuple[bytes, bytes]:
+        entry_hashes = self.hashes[id].tobytes()
+        return entry_hashes[:self.hash_size], entry_hashes[self.hash_size:]
+
+    def get_ids(self) -> list[int]:
+        return np.flatnonzero(self.offsets[:, 0] >= 0).tolist()
+
+    def get_entries(self) -> dict[int : tuple[str, str]]:
+        return {id : self.get(id) for id in self.get_ids()}
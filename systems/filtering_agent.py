@@ -1,76 +1,216 @@
+import os
+import json
+import asyncio
+import threading
+from functools import partial
 from typing import Callable
-from systems.therapists import PreferredTherapists
-from systems.model.model import Messages, ChatModel, Tools
+from weakref import WeakKeyDictionary
+from concurrent.futures import ThreadPoolExecutor
+from systems.therapists import Therapists, PreferredTherapists
+from systems.preference_matcher import PreferenceMatcher, PreferenceMatch
+from systems.model.model import Messages, ChatModel, AsyncChatModel, Tools, TokenUsage
 
 class FilteringAgent:
-    messages : Messages
     chat_model : ChatModel
+    async_chat_model : AsyncChatModel | None
     agent_tools : dict[str : Callable]
-    preferred_therapists : PreferredTherapists
+    multi_facet : bool
+    fast_path_updates : dict[str : str] = {
+        "gender" : "update_preferred_gender",
+        "languages" : "update_preferred_language",
+        "patient_age_group" : "update_preferred_patient_age_group",
+        "specialisations" : "update_preferred_specialisation"
+    }
+    sub_agents : WeakKeyDictionary = WeakKeyDictionary()
+    sub_agents_lock : threading.Lock = threading.Lock()
+    executor : ThreadPoolExecutor = ThreadPoolExecutor(
+        max_workers = int(os.environ.get("FILTERING_AGENT_MAX_WORKERS", 8)),
+        thread_name_prefix = "filtering-agent"
+    )
 
     def __init__(
             self,
-            messages : Messages,
             chat_model : ChatModel,
-            preferred_therapists : PreferredTherapists
+            multi_facet : bool = True,
+            async_chat_model : AsyncChatModel = None
             ) -> None:
-        self.messages = messages
         self.chat_model = chat_model
-        self.preferred_therapists = preferred_therapists
+        self.async_chat_model = async_chat_model
+        self.multi_facet = multi_facet
         self.agent_tools = {
             "None" : self.__handle_mismatch_category,
             "gender" : self.__filter_gender,
             "languages" : self.__filter_languages,
             "patient_age_group" : self.__filter_patient_age_group,
             "specialisations" : self.__filter_specialisations,
+            "availability" : self.__filter_availability,
             "rates" : self.__filter_price
         }
     
-    def main(self, **kwargs) -> str:
-        ori_sys_prompt = self.messages.get_sys_prompt()
-        categories = self.preferred_therapists.access_therapists().get_therapist_factors()
-        self.messages.update_sys_prompt(sys_prompt = self.rephrase_preference_prompt)
-        rephrased_preference = self.chat_model.get_response(
-            messages = self.messages,
+    def main(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None,
+            **kwargs
+            ) -> str:
+        if (result := self.__apply_fast_path(messages, preferred_therapists)) is not None:
+            return result
+        if self.multi_facet:
+            if (result := self.__apply_preference_extraction(messages, preferred_therapists, token_usage)) is not None:
+                return result
+        rephrased_preference_future = self.executor.submit(
+            self.chat_model.get_response,
+            messages = self.__get_rephrase_messages(messages),
             model = "gpt-4o-mini",
-            record_response = False
+            record_response = False,
+            token_usage = token_usage
         )
-        self.messages.update_sys_prompt(
-            sys_prompt = self.choose_category_prompt.format(categories = categories))
         category = self.chat_model.get_response(
-            messages = self.messages,
+            messages = self.__get_category_messages(messages, preferred_therapists),
             model = "gpt-4o-mini",
-            record_response = False
+            record_response = False,
+            token_usage = token_usage
         )
+        rephrased_preference = rephrased_preference_future.result()
         selected_tool = self.agent_tools.get(category, None)
         if selected_tool is None:
             return "An error has ocurred. Please call the tool again."
-        result = selected_tool(rephrased_preference)
-        self.messages.update_sys_prompt(sys_prompt = ori_sys_prompt)
+        result = selected_tool(rephrased_preference, preferred_therapists, token_usage)
         if result is None:
-            return str(self.preferred_therapists.get_preferred_therapists())
+            return self.__get_preferred_therapists_response(preferred_therapists)
         return result
 
-    def get_therapist_info(self, **kwargs) -> str:
-        ori_sys_prompt = self.messages.get_sys_prompt()
-        self.messages.update_sys_prompt(sys_prompt = self.get_therapist_name_prompt)
-        tools = Tools()
-        tools.add_tool(
-            self.preferred_therapists.get_therapist_info,
-            "get_therapist_info",
-            "Get therapist info based on their name. " \
-            "If there is no match, it will fetch information from the closest name.",
-            ["therapist_name"],
-            ["Therapist name."]
+    async def amain(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None,
+            **kwargs
+            ) -> str:
+        if (result := self.__apply_fast_path(messages, preferred_therapists)) is not None:
+            return result
+        if self.multi_facet:
+            extracted_preferences = await self.async_chat_model.get_structured_response(
+                messages = self.__get_extraction_messages(messages, preferred_therapists),
+                schema_name = "therapist_preferences",
+                schema = self.preference_extraction_schema,
+                model = "gpt-4o-mini",
+                token_usage = token_usage
+            )
+            if (result := self.__apply_extracted_preferences(extracted_preferences, preferred_therapists)) is not None:
+                return result
+        rephrased_preference, category = await asyncio.gather(
+            self.async_chat_model.get_response(
+                messages = self.__get_rephrase_messages(messages),
+                model = "gpt-4o-mini",
+                record_response = False,
+                token_usage = token_usage
+            ),
+            self.async_chat_model.get_response(
+                messages = self.__get_category_messages(messages, preferred_therapists),
+                model = "gpt-4o-mini",
+                record_response = False,
+                token_usage = token_usage
+            )
         )
+        if category not in self.agent_tools:
+            return "An error has ocurred. Please call the tool again."
+        if category == "None":
+            return self.__handle_mismatch_category(rephrased_preference, preferred_therapists)
+        sub_agent_messages, sub_agent_tools, error_response = self.__get_sub_agent_call(
+            category, rephrased_preference, preferred_therapists
+        )
+        response = await self.async_chat_model.get_response(
+            messages = sub_agent_messages,
+            tools = sub_agent_tools,
+            model = "gpt-4o-mini",
+            token_usage = token_usage
+        )
+        if (result := self.__handle_sub_agent_response(response, error_response)) is None:
+            return self.__get_preferred_therapists_response(preferred_therapists)
+        return result
+
+    def get_fast_path_stats(self) -> dict[str : float]:
+        return PreferenceMatcher.get_stats()
+
+    def get_therapist_info(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None,
+            **kwargs
+            ) -> str:
         response = self.chat_model.get_response(
-            messages = self.messages,
-            tools = tools,
-            model = "gpt-4o-mini"
+            messages = messages.fork(sys_prompt = self.get_therapist_name_prompt),
+            tools = self.__get_therapist_info_tools(preferred_therapists),
+            model = "gpt-4o-mini",
+            token_usage = token_usage
         )
-        self.messages.update_sys_prompt(sys_prompt = ori_sys_prompt)
         return response
 
+    async def aget_therapist_info(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None,
+            **kwargs
+            ) -> str:
+        response = await self.async_chat_model.get_response(
+            messages = messages.fork(sys_prompt = self.get_therapist_name_prompt),
+            tools = self.__get_therapist_info_tools(preferred_therapists),
+            model = "gpt-4o-mini",
+            token_usage = token_usage
+        )
+        return response
+
+    preference_extraction_schema : dict = {
+        "type" : "object",
+        "properties" : {
+            "gender" : {"type" : ["string", "null"]},
+            "languages" : {"type" : ["string", "null"]},
+            "specialisations" : {"type" : ["string", "null"]},
+            "patient_age_group" : {"type" : ["string", "null"]},
+            "rates" : {
+                "anyOf" : [
+                    {
+                        "type" : "object",
+                        "properties" : {
+                            "type" : {"type" : "string", "enum" : ["individual", "couples", "family"]},
+                            "lower_bound" : {"type" : ["integer", "null"]},
+                            "upper_bound" : {"type" : ["integer", "null"]},
+                            "duration" : {"type" : ["string", "null"]}
+                        },
+                        "required" : ["type", "lower_bound", "upper_bound", "duration"],
+                        "additionalProperties" : False
+                    },
+                    {"type" : "null"}
+                ]
+            },
+            "price_adjustment" : {"type" : ["string", "null"], "enum" : ["cheaper", "pricier", None]},
+            "availability" : {
+                "anyOf" : [
+                    {
+                        "type" : "object",
+                        "properties" : {
+                            "days" : {"type" : "string"},
+                            "start_time" : {"type" : ["string", "null"]},
+                            "end_time" : {"type" : ["string", "null"]}
+                        },
+                        "required" : ["days", "start_time", "end_time"],
+                        "additionalProperties" : False
+                    },
+                    {"type" : "null"}
+                ]
+            }
+        },
+        "required" : [
+            "gender", "languages", "specialisations", "patient_age_group",
+            "rates", "price_adjustment", "availability"
+        ],
+        "additionalProperties" : False
+    }
+
     rephrase_preference_prompt : str = \
     "Given a chat history and the latest user preference " \
     "which might reference context in the chat history, " \
@@ -94,6 +234,38 @@ class FilteringAgent:
     "focus on choosing the category based on newer information."
     "You MUST say nothing else and answer with only the category name, or None."
 
+    extract_preferences_prompt : str = \
+    "Given a chat history, extract every therapist preference stated in the latest user message. " \
+    "Use the chat history only to understand what the latest message refers to. " \
+    "Set a preference to null if the latest user message does not mention it. " \
+    "Possible genders: {possible_genders}. " \
+    "Possible languages: {possible_languages}. " \
+    "Possible specialisations: {possible_specialisations}. " \
+    "Possible patient age groups: {possible_patient_age_groups}. " \
+    "Choose the closest possible option where one fits, otherwise use the user's own words. " \
+    "Rates type can only be one of ['individual', 'couples', 'family'], and bounds are whole numbers. " \
+    "Use price_adjustment only if the user asks for cheaper or more expensive options relative to before. " \
+    "Availability days can be any of {possible_days}, or a comma separated combination of them, " \
+    "and times must be in 24-hour HHMM format, e.g. 'after 6pm' is a start time of 1800. " \
+    "If the user refers to their own age, use it to choose the patient age group."
+
+    extraction_error_response : str = \
+    "None of the user's preferences were updated because some could not be matched. " \
+    "Relay this information kindly to the user and ask them to choose from the possible options. " \
+    "Errors: {errors}"
+
+    preferred_therapists_response : str = \
+    "Suitable therapists: {therapists}. " \
+    "Number of suitable therapists matching each option, by factor: {facet_counts}. " \
+    "If the list is long, use these counts to suggest a factor that would narrow it down the most."
+
+    no_exact_match_response : str = \
+    "There are no therapists who match every preference provided. " \
+    "Relay this information kindly to the user and present the closest therapists below instead, " \
+    "mentioning which preferences each of them does not fully meet. " \
+    "Match scores range from 0 (no match) to 1 (full match). " \
+    "Closest therapists: {closest_therapists}."
+
     handle_mismatch_response : str = \
     "The user preference provided was not able to be used in the system. " \
     "Relay this information kindly to the user and suggest a factor that they can consider. " \
@@ -134,176 +306,451 @@ class FilteringAgent:
     "If you are able to update their preference, reply with Done. " \
     "If you are not able to update their preference, reply with Error."
 
+    filter_availability_prompt : str = \
+    "Using the user preference provided, update the days and times they are available for therapy. " \
+    "Days can be any of {possible_days}, or a comma separated combination of them. " \
+    "Times must be in 24-hour HHMM format, e.g. 'after 6pm' is a start time of 1800. " \
+    "Call the tool provided until you have either successfully updated their preference, " \
+    "or know that it is not possible to accomodate their preference. " \
+    "If you are able to update their preference, reply with Done. " \
+    "If you are not able to update their preference, reply with Error."
+
     filter_price_prompt : str = \
     "Using the user preference provided, update their preferred therapist's price. " \
     "Call the tool provided until you have either successfully updated their preference, " \
     "or know that it is not possible to accomodate their preference. " \
+    "If the user asks for a cheaper or more expensive option relative to before, " \
+    "adjust their previous preference instead of setting a new price range. " \
     "If you are able to update their preference, reply with Done. " \
     "If you are not able to update their preference, reply with Error and explain what went wrong."
 
-    def __handle_mismatch_category(self, preference : str) -> str:
-        factors = self.preferred_therapists.access_therapists().get_therapist_factors()
-        return self.handle_mismatch_response.format(preference = preference, factors = factors)
+    gender_error_response : str = \
+    "Inform the user that there are no therapists with their preferred gender at the moment. " \
+    "Be kind and suggest they choose one of the possible genders. " \
+    "Available therapist genders: {possible_genders}."
 
-    def __filter_gender(self, preference : str) -> None | str:
-        possible_genders = self.preferred_therapists.access_therapists().get_therapist_genders()
-        messages = Messages()
-        messages.update_sys_prompt(
-            self.filter_gender_prompt.format(possible_genders = possible_genders)
-        )
-        messages.record_message(
-            content = preference,
-            role = 'user'
-        )
-        tools = Tools()
-        tools.add_tool(
-            self.preferred_therapists.update_preferred_gender,
-            "update_preferred_gender",
-            "Records the user's preferred therapist gender in the system.",
-            ["gender"],
-            ["Preferred therapist gender."]
+    languages_error_response : str = \
+    "Inform the user that there are no therapists who speak their preferred language at the moment. " \
+    "Be kind and suggest they choose one of the possible languages. " \
+    "Available therapist languages: {possible_languages}."
+
+    patient_age_group_error_response : str = \
+    "Inform the user that there are no therapists with their preferred target patient age group at the moment. " \
+    "Be kind and suggest they choose one of the possible target patient age groups. " \
+    "Available therapist's target patient age groups: {possible_patient_age_groups}."
+
+    specialisations_error_response : str = \
+    "Inform the user that there are no therapists with their preferred specialisation at the moment. " \
+    "Be kind and suggest they choose one of the possible specialisations. " \
+    "Available therapist specialisations: {possible_specialisations}."
+
+    availability_error_response : str = \
+    "Inform the user that their availability could not be understood. " \
+    "Be kind and ask them which days of the week and times of day suit them."
+
+    def __apply_fast_path(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists
+            ) -> str | None:
+        if (preference := messages.get_latest_user_message()) is None:
+            return None
+        matcher = PreferenceMatcher.get_matcher(preferred_therapists.access_therapists())
+        matches = matcher.match(preference)
+        if not matcher.is_confident(matches):
+            PreferenceMatcher.record_outcome(fast_path = False)
+            return None
+        previous_preferences = preferred_therapists.access_preferences().copy()
+        for preference_match in matches:
+            result = self.__apply_preference_match(preference_match, preferred_therapists)
+            if result.startswith("ValueError"):
+                preferred_therapists.restore_preferences(previous_preferences)
+                PreferenceMatcher.record_outcome(fast_path = False)
+                return None
+        PreferenceMatcher.record_outcome(fast_path = True)
+        return self.__get_preferred_therapists_response(preferred_therapists)
+
+    def __apply_preference_match(
+            self, 
+            preference_match : PreferenceMatch, 
+            preferred_therapists : PreferredTherapists
+            ) -> str:
+        if preference_match.category == "rates":
+            type, lower_bound, upper_bound = preference_match.value
+            if type is None and (rates := preferred_therapists.access_preferences().rates) is not None:
+                type = rates[0]
+            return preferred_therapists.update_preferred_price(
+                upper_bound = upper_bound,
+                lower_bound = lower_bound,
+                type = type
+            )
+        if preference_match.category == "relative_rates":
+            return preferred_therapists.adjust_preferred_price(direction = preference_match.value)
+        update_preference = getattr(preferred_therapists, self.fast_path_updates.get(preference_match.category))
+        return update_preference(preference_match.value)
+
+    def __apply_preference_extraction(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists,
+            token_usage : TokenUsage = None
+            ) -> str | None:
+        extracted_preferences = self.chat_model.get_structured_response(
+            messages = self.__get_extraction_messages(messages, preferred_therapists),
+            schema_name = "therapist_preferences",
+            schema = self.preference_extraction_schema,
+            model = "gpt-4o-mini",
+            token_usage = token_usage
         )
+        return self.__apply_extracted_preferences(extracted_preferences, preferred_therapists)
+
+    def __get_extraction_messages(
+            self, 
+            messages : Messages, 
+            preferred_therapists : PreferredTherapists
+            ) -> Messages:
+        sub_agent_prompts, _ = self.__get_sub_agents(preferred_therapists.access_therapists())
+        base_messages, _ = sub_agent_prompts.get("preferences")
+        return messages.fork(sys_prompt = base_messages.get_sys_prompt())
+
+    def __apply_extracted_preferences(
+            self, 
+            extracted_preferences : dict, 
+            preferred_therapists : PreferredTherapists
+            ) -> str | None:
+        if not (preference_updates := self.__get_preference_updates(extracted_preferences, preferred_therapists)):
+            return None
+        previous_preferences = preferred_therapists.access_preferences().copy()
+        try:
+            errors = [
+                result for preference_update in preference_updates
+                if (result := preference_update()).startswith("ValueError")
+            ]
+        except (ValueError, TypeError) as error:
+            errors = [f"ValueError: {error}"]
+        if errors:
+            preferred_therapists.restore_preferences(previous_preferences)
+            return self.extraction_error_response.format(errors = " ".join(errors))
+        return self.__get_preferred_therapists_response(preferred_therapists)
+
+    def __get_preference_updates(
+            self, 
+            extracted_preferences : dict, 
+            preferred_therapists : PreferredTherapists
+            ) -> list[Callable[[], str]]:
+        matcher = PreferenceMatcher.get_matcher(preferred_therapists.access_therapists())
+        preference_updates = [
+            partial(getattr(preferred_therapists, update_name), matcher.get_canonical_value(category, value))
+            for category, update_name in self.fast_path_updates.items()
+            if (value := extracted_preferences.get(category)) is not None
+        ]
+        if (rates := extracted_preferences.get("rates")) is not None:
+            preference_updates.append(partial(preferred_therapists.update_preferred_price, **rates))
+        elif (direction := extracted_preferences.get("price_adjustment")) is not None:
+            preference_updates.append(partial(preferred_therapists.adjust_preferred_price, direction))
+        if (availability := extracted_preferences.get("availability")) is not None:
+            preference_updates.append(
+                partial(preferred_therapists.update_preferred_availability, **availability)
+            )
+        return preference_updates
+
+    def __get_preferred_therapists_response(self, preferred_therapists : PreferredTherapists) -> str:
+        if preferred_therapist_names := preferred_therapists.get_preferred_therapists():
+            return self.preferred_therapists_response.format(
+                therapists = preferred_therapist_names,
+                facet_counts = json.dumps(preferred_therapists.get_facet_counts())
+            )
+        if not (closest_therapists := preferred_therapists.get_closest_therapists()):
+            return str(preferred_therapist_names)
+        return self.no_exact_match_response.format(closest_therapists = json.dumps(closest_therapists))
+
+    def __handle_mismatch_category(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> str:
+        factors = preferred_therapists.access_therapists().get_therapist_factors()
+        return self.handle_mismatch_response.format(preference = preference, factors = factors)
+
+    def __filter_gender(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        return self.__run_sub_agent("gender", preference, preferred_therapists, token_usage)
+
+    def __filter_languages(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        return self.__run_sub_agent("languages", preference, preferred_therapists, token_usage)
+
+    def __filter_patient_age_group(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        return self.__run_sub_agent("patient_age_group", preference, preferred_therapists, token_usage)
+
+    def __filter_specialisations(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        return self.__run_sub_agent("specialisations", preference, preferred_therapists, token_usage)
+
+    def __filter_availability(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        return self.__run_sub_agent("availability", preference, preferred_therapists, token_usage)
+
+    def __filter_price(
+            self, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists, 
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        return self.__run_sub_agent("rates", preference, preferred_therapists, token_usage)
+
+    def __run_sub_agent(
+            self, 
+            category : str, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists,
+            token_usage : TokenUsage = None
+            ) -> None | str:
+        messages, tools, error_response = self.__get_sub_agent_call(category, preference, preferred_therapists)
         response = self.chat_model.get_response(
             messages = messages,
             tools = tools,
-            model = "gpt-4o-mini"
+            model = "gpt-4o-mini",
+            token_usage = token_usage
         )
-        if response.startswith("Done"):
-            return None
-        elif response.startswith("Error"):
-            return \
-            "Inform the user that there are no therapists with their preferred gender at the moment. " \
-            "Be kind and suggest they choose one of the possible genders. " \
-            f"Available therapist genders: {possible_genders}."
-        else:
-            return response
+        return self.__handle_sub_agent_response(response, error_response)
 
-    def __filter_languages(self, preference : str) -> None | str:
-        possible_languages = self.preferred_therapists.access_therapists().get_therapist_languages()
-        messages = Messages()
-        messages.update_sys_prompt(
-            self.filter_languages_prompt.format(possible_languages = possible_languages)
-        )
+    def __get_sub_agent_call(
+            self, 
+            category : str, 
+            preference : str, 
+            preferred_therapists : PreferredTherapists
+            ) -> tuple[Messages, Tools, str | None]:
+        sub_agent_prompts, sub_agent_tools = self.__get_sub_agents(preferred_therapists.access_therapists())
+        base_messages, error_response = sub_agent_prompts.get(category)
+        messages = base_messages.fork()
         messages.record_message(
             content = preference,
             role = 'user'
         )
-        tools = Tools()
-        tools.add_tool(
-            self.preferred_therapists.update_preferred_language,
-            "update_preferred_language",
-            "Records the user's preferred language in the system.",
-            ["language"],
-            ["Preferred language the therapist speaks."]
-        )
-        response = self.chat_model.get_response(
-            messages = messages,
-            tools = tools,
-            model = "gpt-4o-mini"
-        )
+        tools = sub_agent_tools.get(category).bind(preferred_therapists = preferred_therapists)
+        return messages, tools, error_response
+
+    def __handle_sub_agent_response(self, response : str, error_response : str | None) -> None | str:
         if response.startswith("Done"):
             return None
-        elif response.startswith("Error"):
-            return \
-            "Inform the user that there are no therapists who speak their preferred language at the moment. " \
-            "Be kind and suggest they choose one of the possible languages. " \
-            f"Available therapist languages: {possible_languages}." 
+        elif response.startswith("Error") and error_response is not None:
+            return error_response
         else:
             return response
 
-    def __filter_patient_age_group(self, preference : str) -> None | str:
-        possible_patient_age_groups = self.preferred_therapists.access_therapists().get_therapist_patient_age_groups()
+    def __get_therapist_info_tools(self, preferred_therapists : PreferredTherapists) -> Tools:
+        _, sub_agent_tools = self.__get_sub_agents(preferred_therapists.access_therapists())
+        return sub_agent_tools.get("therapist_info").bind(preferred_therapists = preferred_therapists)
+
+    def __get_rephrase_messages(self, messages : Messages) -> Messages:
+        return messages.fork(sys_prompt = self.rephrase_preference_prompt)
+
+    def __get_category_messages(self, messages : Messages, preferred_therapists : PreferredTherapists) -> Messages:
+        categories = preferred_therapists.access_therapists().get_therapist_factors()
+        return messages.fork(sys_prompt = self.choose_category_prompt.format(categories = categories))
+
+    def __get_sub_agents(
+            self, 
+            therapists : Therapists
+            ) -> tuple[dict[str : tuple[Messages, str | None]], dict[str : Tools]]:
+        with self.sub_agents_lock:
+            if (cached_sub_agents := self.sub_agents.get(therapists, None)) is not None:
+                return cached_sub_agents[1:]
+            vocabulary = self.__get_vocabulary(therapists)
+            for cached_vocabulary, prompts, tools in self.sub_agents.values():
+                if cached_vocabulary == vocabulary:
+                    break
+            else:
+                prompts = self.__build_sub_agent_prompts(therapists)
+                tools = self.__build_sub_agent_tools()
+            self.sub_agents[therapists] = (vocabulary, prompts, tools)
+            return prompts, tools
+
+    def __get_vocabulary(self, therapists : Therapists) -> tuple[tuple[str]]:
+        return (
+            tuple(therapists.get_therapist_genders()),
+            tuple(therapists.get_therapist_languages()),
+            tuple(therapists.get_therapist_patient_age_groups()),
+            tuple(therapists.get_therapist_specialisations()),
+            tuple(therapists.days),
+            tuple(therapists.day_aliases.keys())
+        )
+
+    def __build_sub_agent_prompts(self, therapists : Therapists) -> dict[str : tuple[Messages, str | None]]:
+        possible_genders = therapists.get_therapist_genders()
+        possible_languages = therapists.get_therapist_languages()
+        possible_patient_age_groups = therapists.get_therapist_patient_age_groups()
+        possible_specialisations = therapists.get_therapist_specialisations()
+        possible_days = list(therapists.days) + list(therapists.day_aliases.keys())
+        return {
+            "gender" : (
+                self.__get_base_messages(
+                    self.filter_gender_prompt.format(possible_genders = possible_genders)
+                ),
+                self.gender_error_response.format(possible_genders = possible_genders)
+            ),
+            "languages" : (
+                self.__get_base_messages(
+                    self.filter_languages_prompt.format(possible_languages = possible_languages)
+                ),
+                self.languages_error_response.format(possible_languages = possible_languages)
+            ),
+            "patient_age_group" : (
+                self.__get_base_messages(
+                    self.filter_patient_age_group_prompt.format(
+                        possible_patient_age_groups = possible_patient_age_groups
+                    )
+                ),
+                self.patient_age_group_error_response.format(
+                    possible_patient_age_groups = possible_patient_age_groups
+                )
+            ),
+            "specialisations" : (
+                self.__get_base_messages(
+                    self.filter_specialisations_prompt.format(possible_specialisations = possible_specialisations)
+                ),
+                self.specialisations_error_response.format(possible_specialisations = possible_specialisations)
+            ),
+            "availability" : (
+                self.__get_base_messages(
+                    self.filter_availability_prompt.format(possible_days = possible_days)
+                ),
+                self.availability_error_response
+            ),
+            "rates" : (
+                self.__get_base_messages(self.filter_price_prompt),
+                None
+            ),
+            "preferences" : (
+                self.__get_base_messages(
+                    self.extract_preferences_prompt.format(
+                        possible_genders = possible_genders,
+                        possible_languages = possible_languages,
+                        possible_specialisations = possible_specialisations,
+                        possible_patient_age_groups = possible_patient_age_groups,
+                        possible_days = possible_days
+                    )
+                ),
+                None
+            )
+        }
+
+    def __get_base_messages(self, sys_prompt : str) -> Messages:
         messages = Messages()
-        messages.update_sys_prompt(
-            self.filter_patient_age_group_prompt.format(possible_patient_age_groups = possible_patient_age_groups)
+        messages.update_sys_prompt(sys_prompt)
+        return messages
+
+    def __get_preference_tool(self, method_name : str) -> Callable[..., str]:
+        return lambda preferred_therapists, **kwargs : getattr(preferred_therapists, method_name)(**kwargs)
+
+    def __build_sub_agent_tools(self) -> dict[str : Tools]:
+        sub_agent_tools = {category : Tools() for category in (
+            "gender", "languages", "patient_age_group", "specialisations",
+            "availability", "rates", "therapist_info"
+        )}
+        sub_agent_tools["gender"].add_tool(
+            self.__get_preference_tool("update_preferred_gender"),
+            "update_preferred_gender",
+            "Records the user's preferred therapist gender in the system.",
+            ["gender"],
+            ["Preferred therapist gender."],
+            blocking = False
         )
-        messages.record_message(
-            content = preference,
-            role = 'user'
+        sub_agent_tools["languages"].add_tool(
+            self.__get_preference_tool("update_preferred_language"),
+            "update_preferred_language",
+            "Records the user's preferred language in the system.",
+            ["language"],
+            ["Preferred language the therapist speaks."],
+            blocking = False
         )
-        tools = Tools()
-        tools.add_tool(
-            self.preferred_therapists.update_preferred_patient_age_group,
+        sub_agent_tools["patient_age_group"].add_tool(
+            self.__get_preference_tool("update_preferred_patient_age_group"),
             "update_preferred_patient_age_group",
             "Records the user's preferred therapist's target patient age group in the system.",
             ["patient_age_group"],
-            ["Therapist's target patient age group."]
-        )
-        response = self.chat_model.get_response(
-            messages = messages,
-            tools = tools,
-            model = "gpt-4o-mini"
-        )
-        if response.startswith("Done"):
-            return None
-        elif response.startswith("Error"):
-            return \
-            "Inform the user that there are no therapists with their preferred target patient age group at the moment. " \
-            "Be kind and suggest they choose one of the possible target patient age groups. " \
-            f"Available therapist's target patient age groups: {possible_patient_age_groups}." 
-        else:
-            return response
-
-    def __filter_specialisations(self, preference : str) -> None | str:
-        possible_specialisations = self.preferred_therapists.access_therapists().get_therapist_specialisations()
-        messages = Messages()
-        messages.update_sys_prompt(
-            self.filter_specialisations_prompt.format(possible_specialisations = possible_specialisations)
+            ["Therapist's target patient age group."],
+            blocking = False
         )
-        messages.record_message(
-            content = preference,
-            role = 'user'
-        )
-        tools = Tools()
-        tools.add_tool(
-            self.preferred_therapists.update_preferred_specialisation,
+        sub_agent_tools["specialisations"].add_tool(
+            self.__get_preference_tool("update_preferred_specialisation"),
             "update_preferred_specialisation",
             "Records the user's most suitable therapist specialisation in the system.",
             ["specialisation"],
-            ["Therapist's specialisation."]
-        )
-        response = self.chat_model.get_response(
-            messages = messages,
-            tools = tools,
-            model = "gpt-4o-mini"
+            ["Therapist's specialisation."],
+            blocking = False
         )
-        if response.startswith("Done"):
-            return None
-        elif response.startswith("Error"):
-            return \
-            "Inform the user that there are no therapists with their preferred specialisation at the moment. " \
-            "Be kind and suggest they choose one of the possible specialisations. " \
-            f"Available therapist specialisations: {possible_specialisations}." 
-        else:
-            return response
-
-    def __filter_price(self, preference : str) -> None | str:
-        messages = Messages()
-        messages.update_sys_prompt(self.filter_price_prompt)
-        messages.record_message(
-            content = preference, 
-            role = 'user'
+        sub_agent_tools["availability"].add_tool(
+            self.__get_preference_tool("update_preferred_availability"),
+            "update_preferred_availability",
+            "Records the days and times the user is available for therapy in the system.",
+            ["days", "start_time", "end_time"],
+            [
+                "Comma separated days, e.g. 'mon, wed' or 'weekdays'.",
+                "Earliest start time in 24-hour HHMM format, e.g. 1800.",
+                "Latest end time in 24-hour HHMM format, e.g. 2100."
+            ],
+            ["days"],
+            blocking = False
         )
-        tools = Tools()
-        tools.add_tool(
-            self.preferred_therapists.update_preferred_price,
+        sub_agent_tools["rates"].add_tool(
+            self.__get_preference_tool("update_preferred_price"),
             "update_preferred_price", 
             "Records the user's preferred therapist price range in the system.",
-            ["upper_bound", "lower_bound", "type"],
+            ["upper_bound", "lower_bound", "type", "duration"],
             [
                 "Price upper bound. Must be an integer.", 
                 "Price lower bound. Must be an integer.", 
-                "Type of therapy. Can only be one of ['individual', 'couples', 'family']"
+                "Type of therapy. Can only be one of ['individual', 'couples', 'family']",
+                "Session length, e.g. '50 min' or '80 min'. Leave empty if not specified."
             ],
-            ["type"]
+            ["type"],
+            blocking = False
         )
-        response = self.chat_model.get_response(
-            messages = messages,
-            tools = tools,
-            model = "gpt-4o-mini"
+        sub_agent_tools["rates"].add_tool(
+            self.__get_preference_tool("adjust_preferred_price"),
+            "adjust_preferred_price",
+            "Adjusts the user's previous price range to be cheaper or more expensive.",
+            ["direction", "amount"],
+            [
+                "Can only be one of ['cheaper', 'pricier'].",
+                "Amount to adjust the price by. Must be an integer. Leave empty if not specified."
+            ],
+            ["direction"],
+            blocking = False
         )
-        print(response)
-        if response.startswith("Done"):
-            return None
-        else:
-            return response
+        sub_agent_tools["therapist_info"].add_tool(
+            self.__get_preference_tool("get_therapist_info"),
+            "get_therapist_info",
+            "Get therapist info based on their name. " \
+            "If there is no match, it will fetch information from the closest name.",
+            ["therapist_name"],
+            ["Therapist name."],
+            blocking = False
+        )
+        for tools in sub_agent_tools.values():
+            tools.get_token_count()
+        return sub_agent_tools
@@ -0,0 +1,54 @@
+import unicodedata
+from functools import lru_cache
+from rapidfuzz import fuzz, process
+
+class FuzzyIndex:
+    options : list[str]
+    normalised_options : list[str]
+    normalised_lookup : dict[str : str]
+    score_cutoff : float
+
+    def __init__(self, options : list[str], score_cutoff : float = 60) -> None:
+        self.options = [option for option in options if option is not None]
+        self.normalised_options = [normalise_text(option) for option in self.options]
+        self.normalised_lookup = dict(zip(self.normalised_options, self.options))
+        self.score_cutoff = score_cutoff
+
+    def get_options(self) -> list[str]:
+        return self.options
+
+    def lookup(self, choice : str) -> str | None:
+        return self.normalised_lookup.get(normalise_text(choice), None)
+
+    def extract(self, choice : str, limit : int = 5) -> list[str]:
+        results = process.extract(
+            normalise_text(choice),
+            self.normalised_options,
+            scorer = fuzz.WRatio,
+            processor = None,
+            score_cutoff = self.score_cutoff,
+            limit = limit
+        )
+        return [self.options[index] for _, _, index in results]
+
+    def get_closest(self, choice : str) -> str | None:
+        if (option := self.lookup(choice)) is not None:
+            return option
+        result = process.extractOne(
+            normalise_text(choice),
+            self.normalised_options,
+            scorer = fuzz.WRatio,
+            processor = None
+        )
+        if result is None:
+            return None
+        return self.options[result[2]]
+
+    def get_suggestions(self, choice : str, limit : int = 5) -> list[str]:
+        return self.extract(choice, limit) or self.options
+
+@lru_cache(maxsize = 4096)
+def normalise_text(text : str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(character for character in text if not unicodedata.combining(character))
+    return " ".join(text.casefold().split())
@@ -0,0 +1,72 @@
+import re
+import numpy as np
+from collections import Counter
+
+class LexicalIndex:
+    postings : dict[str : tuple[np.ndarray, np.ndarray]]
+    idf : dict[str : float]
+    document_lengths : np.ndarray
+    average_length : float
+    k1 : float = 1.5
+    b : float = 0.75
+    word_pattern : re.Pattern = re.compile(r"[\w$]+")
+    stop_words : set[str] = {
+        "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+        "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "the", "to", "what",
+        "when", "where", "which", "who", "why", "with", "you", "your", "we", "our", "there"
+    }
+
+    def __init__(self, documents : dict[int : str], capacity : int) -> None:
+        self.document_lengths = np.zeros(capacity, dtype = np.float32)
+        term_documents : dict[str : list[tuple[int, int]]] = dict()
+        for id, document in documents.items():
+            term_counts = Counter(self.tokenise(document))
+            self.document_lengths[id] = sum(term_counts.values())
+            for term, count in term_counts.items():
+                term_documents.setdefault(term, list()).append((id, count))
+        document_count = len(documents)
+        self.average_length = float(self.document_lengths.sum() / max(document_count, 1))
+        self.postings = dict()
+        self.idf = dict()
+        for term, entries in term_documents.items():
+            ids, counts = zip(*entries)
+            self.postings[term] = (np.array(ids, dtype = np.int64), np.array(counts, dtype = np.float32))
+            self.idf[term] = float(np.log(1 + (document_count - len(ids) + 0.5) / (len(ids) + 0.5)))
+
+    def tokenise(self, text : str) -> list[str]:
+        return [
+            word for word in self.word_pattern.findall(text.casefold())
+            if word not in self.stop_words
+        ]
+
+    def search(self, query : str, k : int) -> list[tuple[int, float]]:
+        scores = self.__get_scores(self.tokenise(query))
+        if scores is None:
+            return list()
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return list()
+        top_ids = np.argpartition(-scores, k - 1)[:k]
+        top_ids = top_ids[np.argsort(-scores[top_ids], kind = "stable")]
+        return [(int(id), float(scores[id])) for id in top_ids]
+
+    def get_coverage(self, query : str, id : int) -> float:
+        terms = set(self.tokenise(query))
+        unseen_idf = float(np.log(1 + (np.count_nonzero(self.document_lengths) + 0.5) / 0.5))
+        total_idf = sum(self.idf.get(term, unseen_idf) for term in terms)
+        matched_idf = sum(
+            self.idf[term] for term in terms 
+            if term in self.postings and np.any(self.postings[term][0] == id)
+        )
+        return matched_idf / total_idf if total_idf else 0.0
+
+    def __get_scores(self, terms : list[str]) -> np.ndarray | None:
+        terms = [term for term in set(terms) if term in self.postings]
+        if not terms or not self.document_lengths.size:
+            return None
+        scores = np.zeros(self.document_lengths.size, dtype = np.float32)
+        length_norms = self.k1 * (1 - self.b + self.b * self.document_lengths / max(self.average_length, 1e-6))
+        for term in terms:
+            ids, counts = self.postings[term]
+            scores[ids] += self.idf[term] * counts * (self.k1 + 1) / (counts + length_norms[ids])
+        return scores
@@ -0,0 +1,177 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+
+class EmbeddingCache:
+    model_name : str
+    dimensions : int
+    max_entries : int
+    flush_interval : int
+    hits : int
+    misses : int
+    slots : OrderedDict[str : int]
+    free_slots : list[int]
+    vectors : np.memmap
+    slot_keys : np.memmap
+    lock : threading.Lock
+    unsaved_writes : int
+    cache_folder_path : str = os.path.join(os.environ["DATA_FOLDER_PATH"], "cache")
+
+    def __init__(
+            self,
+            model_name : str,
+            dimensions : int,
+            max_entries : int = 20000,
+            flush_interval : int = 100
+            ) -> None:
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self.unsaved_writes = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_folder_path, exist_ok = True)
+        self.__load_state()
+        atexit.register(self.save)
+
+    def get(self, text : str) -> np.ndarray | None:
+        key = self.get_key(text)
+        with self.lock:
+            slot = self.__get_slot(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.slots.move_to_end(key)
+            self.hits += 1
+            return np.array(self.vectors[slot])
+
+    def get_many(self, texts : list[str]) -> tuple[np.ndarray, list[int]]:
+        embeddings_matrix = np.empty((len(texts), self.dimensions), dtype = np.float32)
+        missing_indices = list()
+        with self.lock:
+            for index, text in enumerate(texts):
+                key = self.get_key(text)
+                slot = self.__get_slot(key)
+                if slot is None:
+                    missing_indices.append(index)
+                    continue
+                self.slots.move_to_end(key)
+                embeddings_matrix[index] = self.vectors[slot]
+            self.hits += len(texts) - len(missing_indices)
+            self.misses += len(missing_indices)
+        return embeddings_matrix, missing_indices
+
+    def put(self, text : str, vector : np.ndarray | list[float]) -> None:
+        self.put_many([text], np.asarray(vector, dtype = np.float32).reshape(1, -1))
+
+    def put_many(self, texts : list[str], embeddings_matrix : np.ndarray) -> None:
+        with self.lock:
+            for text, vector in zip(texts, embeddings_matrix):
+                key = self.get_key(text)
+                if (slot := self.slots.get(key, None)) is None:
+                    slot = self.__allocate_slot()
+                self.slots[key] = slot
+                self.slots.move_to_end(key)
+                self.vectors[slot] = vector
+                self.slot_keys[slot] = np.frombuffer(bytes.fromhex(key), dtype = np.uint8)
+            self.unsaved_writes += len(texts)
+            if self.unsaved_writes >= self.flush_interval:
+                self.__save_state()
+
+    def get_stats(self) -> dict[str : int]:
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "entries" : len(self.slots),
+            "max_entries" : self.max_entries
+        }
+
+    def get_key(self, text : str) -> str:
+        normalised_text = self.normalise_text(text)
+        digest = hashlib.sha256(
+            f"{self.model_name}\0{normalised_text}".encode("utf-8")
+        )
+        return digest.hexdigest()
+
+    def normalise_text(self, text : str) -> str:
+        text = unicodedata.normalize("NFKC", text)
+        return " ".join(text.casefold().split())
+
+    def save(self) -> None:
+        with self.lock:
+            self.__save_state()
+
+    def __get_slot(self, key : str) -> int | None:
+        slot = self.slots.get(key, None)
+        if slot is None:
+            return None
+        if self.slot_keys[slot].tobytes() != bytes.fromhex(key):
+            del self.slots[key]
+            self.free_slots.append(slot)
+            return None
+        return slot
+
+    def __allocate_slot(self) -> int:
+        if self.free_slots:
+            return self.free_slots.pop()
+        _, slot = self.slots.popitem(last = False)
+        return slot
+
+    def __get_paths(self) -> tuple[str, str, str]:
+        vectors_path = os.path.join(self.cache_folder_path, f"{self.model_name}.npy")
+        keys_path = os.path.join(self.cache_folder_path, f"{self.model_name}.keys.npy")
+        index_path = os.path.join(self.cache_folder_path, f"{self.model_name}.json")
+        return vectors_path, keys_path, index_path
+
+    def __load_state(self) -> None:
+        vectors_path, keys_path, index_path = self.__get_paths()
+        slots = OrderedDict()
+        vectors = self.__open_memmap(vectors_path, np.float32, self.dimensions)
+        slot_keys = self.__open_memmap(keys_path, np.uint8, 32)
+        if vectors is None or slot_keys is None or not os.path.isfile(index_path):
+            vectors = self.__create_memmap(vectors_path, np.float32, self.dimensions)
+            slot_keys = self.__create_memmap(keys_path, np.uint8, 32)
+        else:
+            with open(index_path, 'r') as index_file:
+                index : dict = json.loads(index_file.read())
+            slots = OrderedDict(index.get("slots", list()))
+        used_slots = set(slots.values())
+        self.vectors = vectors
+        self.slot_keys = slot_keys
+        self.slots = slots
+        self.free_slots = [
+            slot for slot in reversed(range(self.max_entries)) if slot not in used_slots
+        ]
+
+    def __open_memmap(self, path : str, dtype : type, width : int) -> np.memmap | None:
+        if not os.path.isfile(path):
+            return None
+        array = np.load(path, mmap_mode = "r+")
+        if array.shape != (self.max_entries, width) or array.dtype != dtype:
+            return None
+        return array
+
+    def __create_memmap(self, path : str, dtype : type, width : int) -> np.memmap:
+        return np.lib.format.open_memmap(
+            path,
+            mode = "w+",
+            dtype = dtype,
+            shape = (self.max_entries, width)
+        )
+
+    def __save_state(self) -> None:
+        _, _, index_path = self.__get_paths()
+        self.vectors.flush()
+        self.slot_keys.flush()
+        temp_index_path = f"{index_path}.tmp"
+        with open(temp_index_path, 'w') as index_file:
+            json.dump({"slots" : list(self.slots.items())}, index_file)
+        os.replace(temp_index_path, index_path)
+        self.unsaved_writes = 0
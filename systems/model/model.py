@@ -1,11 +1,22 @@
 import os
 import json
+import httpx
+import asyncio
+import inspect
 import logging
 import tiktoken
-from openai import OpenAI
-from typing import Literal, Callable
+import threading
+import numpy as np
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI, AsyncOpenAI
+from typing import Literal, Callable, Iterator
 from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, ChoiceDeltaToolCall
+from openai.types.completion_usage import CompletionUsage
 from openai.types.create_embedding_response import CreateEmbeddingResponse
+from systems.model.embedding_cache import EmbeddingCache
 
 class TokenLimitError(Exception):
     def __init__(self, message = "Token limit exceeded."):
@@ -22,96 +33,202 @@ class UnexpectedError(Exception):
 class TokenEncoder:
     chat_encoding : tiktoken.Encoding = tiktoken.get_encoding("o200k_base")
     embed_encoding : tiktoken.Encoding = tiktoken.get_encoding("cl100k_base")
+    tokens_per_message : int = 3
+    tokens_per_name : int = 1
+    tokens_per_tool_call : int = 3
+    tokens_per_reply : int = 3
+    tokens_per_function : int = 7
+    tokens_per_properties : int = 3
+    tokens_per_property : int = 3
+    tokens_per_enum : int = -3
+    tokens_per_enum_item : int = 3
+    tokens_per_functions_end : int = 12
 
+    @lru_cache(maxsize = 8192)
     def get_chat_token_count(text : str) -> int:
         num_tokens = len(TokenEncoder.chat_encoding.encode(text = text))
         return num_tokens
+
+    def get_message_token_count(message : dict) -> int:
+        num_tokens = TokenEncoder.tokens_per_message
+        for key, value in message.items():
+            if key == "tool_calls":
+                for tool_call in value:
+                    num_tokens += TokenEncoder.tokens_per_tool_call
+                    num_tokens += TokenEncoder.get_chat_token_count(tool_call["function"]["name"])
+                    num_tokens += TokenEncoder.get_chat_token_count(tool_call["function"]["arguments"])
+            elif isinstance(value, str):
+                num_tokens += TokenEncoder.get_chat_token_count(value)
+            if key == "name":
+                num_tokens += TokenEncoder.tokens_per_name
+        return num_tokens
+
+    def get_tools_token_count(tools : list[dict]) -> int:
+        if not tools:
+            return 0
+        return TokenEncoder.get_tools_json_token_count(json.dumps(tools))
+
+    @lru_cache(maxsize = 256)
+    def get_tools_json_token_count(tools_json : str) -> int:
+        num_tokens = TokenEncoder.tokens_per_functions_end
+        for tool in json.loads(tools_json):
+            function = tool["function"]
+            num_tokens += TokenEncoder.tokens_per_function
+            num_tokens += TokenEncoder.get_chat_token_count(
+                f"{function['name']}:{function.get('description', '').removesuffix('.')}"
+            )
+            if not (properties := function.get("parameters", dict()).get("properties", dict())):
+                continue
+            num_tokens += TokenEncoder.tokens_per_properties
+            for property_name, property_schema in properties.items():
+                num_tokens += TokenEncoder.tokens_per_property
+                for enum_item in property_schema.get("enum", list()):
+                    num_tokens += TokenEncoder.tokens_per_enum_item
+                    num_tokens += TokenEncoder.get_chat_token_count(str(enum_item))
+                if "enum" in property_schema:
+                    num_tokens += TokenEncoder.tokens_per_enum
+                num_tokens += TokenEncoder.get_chat_token_count(
+                    f"{property_name}:{property_schema.get('type', '')}:"
+                    f"{property_schema.get('description', '').removesuffix('.')}"
+                )
+        return num_tokens
     
     def get_embed_token_count(text : str) -> int:
         num_tokens = len(TokenEncoder.embed_encoding.encode(text = text))
         return num_tokens
 
 class Messages:
-    max_messages : int | None
+    max_tokens : int | None
     sys_prompt : dict[str : str]
-    convo_messages : list[dict[str : str]]
-    convo_tokens : list[int]
+    sys_prompt_tokens : int
+    summary : dict[str : str] | None
+    summary_tokens : int
+    convo_messages : deque[dict[str : str]]
+    convo_tokens : deque[int]
+    total_convo_tokens : int
 
-    def __init__(self, max_messages : int = None) -> None:
-        self.max_messages = max_messages
+    def __init__(self, max_tokens : int = None) -> None:
+        self.max_tokens = max_tokens
         self.sys_prompt = {
             "role" : "system",
             "content" : ""
         }
-        self.convo_messages = list()
-        self.convo_tokens = list()
+        self.sys_prompt_tokens = 0
+        self.summary = None
+        self.summary_tokens = 0
+        self.convo_messages = deque()
+        self.convo_tokens = deque()
+        self.total_convo_tokens = 0
 
     def __repr__(self) -> str:
         return str(self.parse_messages())
 
-    def get_max_messages(self) -> int | None:
-        return self.max_messages
+    def get_max_tokens(self) -> int | None:
+        return self.max_tokens
 
     def get_sys_prompt(self) -> str:
         return self.sys_prompt.get("content")
 
-    def get_convo_messages(self) -> list[dict[str : str]]:
+    def get_summary(self) -> str | None:
+        return None if self.summary is None else self.summary.get("content")
+
+    def get_convo_messages(self) -> deque[dict[str : str]]:
         return self.convo_messages
+
+    def get_convo_tokens(self) -> int:
+        return self.total_convo_tokens
     
     def get_latest_convo_message(self) -> str:
         return self.get_convo_messages()[-1].get("content")
     
+    def get_latest_user_message(self) -> str | None:
+        for message in reversed(self.get_convo_messages()):
+            if message.get("role") == "user":
+                return message.get("content")
+        return None
+    
     def get_total_tokens(self) -> int:
-        sys_prompt_tokens = TokenEncoder.get_chat_token_count(
-            self.sys_prompt.get("content")
-        )
-        return sum(self.convo_tokens) + sys_prompt_tokens
+        return \
+        self.total_convo_tokens + self.sys_prompt_tokens + \
+        self.summary_tokens + TokenEncoder.tokens_per_reply
+    
+    def get_foldable_message_count(self, retained_tokens : int) -> int:
+        message_count = 0
+        remaining_tokens = self.total_convo_tokens
+        while remaining_tokens > retained_tokens:
+            group_size = self.__get_group_size(message_count)
+            if message_count + group_size >= len(self.convo_messages):
+                break
+            for index in range(message_count, message_count + group_size):
+                remaining_tokens -= self.convo_tokens[index]
+            message_count += group_size
+        return message_count
     
     def parse_messages(self) -> list[dict[str : str]]:
-        return [self.sys_prompt, *self.convo_messages]
+        if self.summary is None:
+            return [self.sys_prompt, *self.convo_messages]
+        return [self.sys_prompt, self.summary, *self.convo_messages]
+    
+    def fork(self, sys_prompt : str = None) -> "Messages":
+        forked_messages = Messages(max_tokens = self.max_tokens)
+        if sys_prompt is None:
+            forked_messages.sys_prompt["content"] = self.get_sys_prompt()
+            forked_messages.sys_prompt_tokens = self.sys_prompt_tokens
+        else:
+            forked_messages.update_sys_prompt(sys_prompt)
+        forked_messages.summary = self.summary
+        forked_messages.summary_tokens = self.summary_tokens
+        forked_messages.convo_messages = self.convo_messages.copy()
+        forked_messages.convo_tokens = self.convo_tokens.copy()
+        forked_messages.total_convo_tokens = self.total_convo_tokens
+        return forked_messages
     
-    def update_max_messages(self, max_messages : int = None) -> None:
-        if max_messages < self.max_messages:
-            while len(self.convo_messages) > max_messages:
-                self.convo_messages.pop(0)
-                self.convo_tokens.pop(0)
-        self.max_messages = max_messages
+    def update_max_tokens(self, max_tokens : int = None) -> None:
+        self.max_tokens = max_tokens
+        self.__prune_to_token_budget(self.max_tokens)
     
     def update_sys_prompt(self, sys_prompt : str) -> None:
         self.sys_prompt["content"] = sys_prompt
+        self.sys_prompt_tokens = TokenEncoder.get_message_token_count(self.sys_prompt)
+        self.__prune_to_token_budget(self.max_tokens)
     
+    def fold_leading_messages(self, message_count : int, summary : str) -> None:
+        for _ in range(message_count):
+            self.convo_messages.popleft()
+            self.total_convo_tokens -= self.convo_tokens.popleft()
+        self.summary = {
+            "role" : "system",
+            "content" : summary
+        }
+        self.summary_tokens = TokenEncoder.get_message_token_count(self.summary)
+
     def record_message(
             self, 
             content : str, 
             role : Literal["user", "assistant"] = None
             ) -> None:
         self.__check_valid_role(role = role)
-        self.__prune_max_messages()
         self.__append_new_message(role = role, content = content)
+        self.__prune_to_token_budget(self.max_tokens)
 
-    def record_tool_call(
-            self,
-            tool_call_id : str,
-            tool_call_args_json : str,
-            tool_call_name : str
+    def record_tool_calls(
+            self, 
+            tool_calls : list[tuple[str, str, str]], 
+            content : str = None
             ) -> None:
-        self.__prune_max_messages()
-        self.__append_new_tool_call(
-            tool_call_id = tool_call_id,
-            tool_call_args_json = tool_call_args_json,
-            tool_call_name = tool_call_name
-        )
+        self.__append_new_tool_calls(tool_calls = tool_calls, content = content)
+        self.__prune_to_token_budget(self.max_tokens)
     
     def record_tool_response(
             self,
             tool_call_id : str,
             tool_response_json : str
             ) -> None:
-        self.__prune_max_messages()
         self.__append_new_tool_response(
             tool_response_json = tool_response_json,
             tool_call_id = tool_call_id
         )
+        self.__prune_to_token_budget(self.max_tokens)
 
     def __check_valid_role(self, role : str | None) -> None:
         if role is None:
@@ -119,26 +236,47 @@ class Messages:
                 f"Invalid input for role: {role} \n" 
                 "Must be one of 'user' or 'assistant'.")
 
-    def __prune_max_messages(self) -> None:
-        if self.max_messages:
-            if len(self.convo_messages) == self.max_messages:
-                self.convo_messages.pop(0)
-                self.convo_tokens.pop(0)
+    def fit_token_budget(self, max_tokens : int) -> None:
+        self.__prune_to_token_budget(max_tokens)
+
+    def __prune_to_token_budget(self, max_tokens : int | None) -> None:
+        if not max_tokens:
+            return None
+        while self.convo_messages and self.get_total_tokens() > max_tokens:
+            group_size = self.__get_group_size(0)
+            if group_size >= len(self.convo_messages):
+                break
+            for _ in range(group_size):
+                self.convo_messages.popleft()
+                self.total_convo_tokens -= self.convo_tokens.popleft()
+
+    def __get_group_size(self, start : int) -> int:
+        group_size = 1
+        if "tool_calls" in self.convo_messages[start]:
+            while (
+                start + group_size < len(self.convo_messages) 
+                and self.convo_messages[start + group_size].get("role") == "tool"
+            ):
+                group_size += 1
+        return group_size
+    
+    def __append_message(self, new_message : dict, token_count : int) -> None:
+        self.convo_messages.append(new_message)
+        self.convo_tokens.append(token_count)
+        self.total_convo_tokens += token_count
     
     def __append_new_message(self, role : str, content : str) -> None:
         new_message = {
             "role" : role,
             "content" : content
         }
-        token_count = TokenEncoder.get_chat_token_count(content)
-        self.convo_messages.append(new_message)
-        self.convo_tokens.append(token_count)
+        token_count = TokenEncoder.get_message_token_count(new_message)
+        self.__append_message(new_message, token_count)
     
-    def __append_new_tool_call(
-            self,
-            tool_call_id : str,
-            tool_call_args_json : str,
-            tool_call_name : str
+    def __append_new_tool_calls(
+            self, 
+            tool_calls : list[tuple[str, str, str]], 
+            content : str | None
             ) -> None:
         new_message = {
             "role": "assistant",
@@ -151,11 +289,13 @@ class Messages:
                         "name": tool_call_name
                     }
                 }
+                for tool_call_id, tool_call_name, tool_call_args_json in tool_calls
             ]
         }
-        token_count = TokenEncoder.get_chat_token_count(json.dumps(new_message))
-        self.convo_messages.append(new_message)
-        self.convo_tokens.append(token_count)
+        if content:
+            new_message["content"] = content
+        token_count = TokenEncoder.get_message_token_count(new_message)
+        self.__append_message(new_message, token_count)
     
     def __append_new_tool_response(
             self,
@@ -167,20 +307,42 @@ class Messages:
             "content": tool_response_json,
             "tool_call_id": tool_call_id
         }
-        token_count = TokenEncoder.get_chat_token_count(json.dumps(new_message))
-        self.convo_messages.append(new_message)
-        self.convo_tokens.append(token_count)
+        token_count = TokenEncoder.get_message_token_count(new_message)
+        self.__append_message(new_message, token_count)
 
 class Tools:
     tools_list : list[dict]
     tools_dict : dict[str : Callable]
+    tools_tokens : int | None
+    context : dict[str : object]
+    serial_tools : set[str]
+    inline_tools : set[str]
 
     def __init__(self):
         self.tools_list = list()
         self.tools_dict = dict()
+        self.tools_tokens = None
+        self.context = dict()
+        self.serial_tools = set()
+        self.inline_tools = set()
 
     def get_tools(self) -> list[dict]:
         return self.tools_list
+
+    def bind(self, **context) -> "Tools":
+        bound_tools = Tools()
+        bound_tools.tools_list = self.tools_list
+        bound_tools.tools_dict = self.tools_dict
+        bound_tools.serial_tools = self.serial_tools
+        bound_tools.inline_tools = self.inline_tools
+        bound_tools.tools_tokens = self.get_token_count()
+        bound_tools.context = {**self.context, **context}
+        return bound_tools
+
+    def get_token_count(self) -> int:
+        if self.tools_tokens is None:
+            self.tools_tokens = TokenEncoder.get_tools_token_count(self.tools_list)
+        return self.tools_tokens
     
     def add_tool(
         self,
@@ -189,7 +351,9 @@ class Tools:
         func_desc : str,
         arg_names : list[str] = None,
         arg_descs : list[str] = None,
-        required_args : list[str] | str = "all"
+        required_args : list[str] | str = "all",
+        run_concurrently : bool = True,
+        blocking : bool = True
         ) -> None:
 
         if arg_names is None:
@@ -225,6 +389,11 @@ class Tools:
         }
         self.tools_list.append(tool)
         self.tools_dict[func_name] = func
+        if not run_concurrently:
+            self.serial_tools.add(func_name)
+        if not blocking:
+            self.inline_tools.add(func_name)
+        self.tools_tokens = None
 
     def remove_tool(self, function_name : str) -> None:
         self.tools_list = list(
@@ -234,10 +403,23 @@ class Tools:
                 self.tools_list
             )
         )
+        self.tools_tokens = None
     
+    def is_concurrent(self, func_name : str) -> bool:
+        return func_name not in self.serial_tools
+
     def use_tool(self, func_name : str, func_args_json : str):
         func_args = json.loads(func_args_json)
-        return self.tools_dict.get(func_name)(**func_args)
+        return self.tools_dict.get(func_name)(**self.context, **func_args)
+    
+    async def use_tool_async(self, func_name : str, func_args_json : str):
+        func_args = json.loads(func_args_json)
+        func = self.tools_dict.get(func_name)
+        if inspect.iscoroutinefunction(func):
+            return await func(**self.context, **func_args)
+        if func_name in self.inline_tools:
+            return func(**self.context, **func_args)
+        return await asyncio.to_thread(func, **self.context, **func_args)
 
     def __args_num_check(
             self, 
@@ -284,21 +466,94 @@ class Tools:
             "additionalProperties" : False
         }
 
+class AsyncClientPool:
+    client : AsyncOpenAI | None = None
+    max_connections : int = int(os.environ.get("OPENAI_MAX_CONNECTIONS", 100))
+    max_keepalive_connections : int = int(os.environ.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20))
+    lock : threading.Lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls) -> AsyncOpenAI:
+        with cls.lock:
+            if cls.client is None:
+                cls.client = AsyncOpenAI(
+                    http_client = httpx.AsyncClient(
+                        limits = httpx.Limits(
+                            max_connections = cls.max_connections,
+                            max_keepalive_connections = cls.max_keepalive_connections
+                        )
+                    )
+                )
+            return cls.client
+
+class TokenUsage:
+    prompt_tokens : dict[str : int]
+    completion_tokens : dict[str : int]
+    embed_tokens : int
+    embed_cache_hits : int
+    embed_cache_misses : int
+    lock : threading.Lock
+
+    def __init__(self) -> None:
+        self.prompt_tokens = {
+            "gpt-4o-mini" : 0, "gpt-4o" : 0
+        }
+        self.completion_tokens = {
+            "gpt-4o-mini" : 0, "gpt-4o" : 0
+        }
+        self.embed_tokens = 0
+        self.embed_cache_hits = 0
+        self.embed_cache_misses = 0
+        self.lock = threading.Lock()
+
+    def record_chat_usage(self, model : str, prompt_tokens : int, completion_tokens : int) -> None:
+        with self.lock:
+            self.prompt_tokens[model] += prompt_tokens
+            self.completion_tokens[model] += completion_tokens
+
+    def record_embed_usage(
+            self, 
+            tokens : int = 0, 
+            cache_hits : int = 0, 
+            cache_misses : int = 0
+            ) -> None:
+        with self.lock:
+            self.embed_tokens += tokens
+            self.embed_cache_hits += cache_hits
+            self.embed_cache_misses += cache_misses
+
+    def get_chat_cost(self) -> dict[str : float]:
+        input_cost_4o = 0.00250 * self.prompt_tokens.get("gpt-4o") / 1000
+        output_cost_4o = 0.01000 * self.completion_tokens.get("gpt-4o") / 1000
+        input_cost_4o_mini = 0.000150 * self.prompt_tokens.get("gpt-4o-mini") / 1000
+        output_cost_4o_mini = 0.000600 * self.completion_tokens.get("gpt-4o-mini") / 1000
+        return {
+            "in-gpt-4o" : round(input_cost_4o, 5),
+            "out-gpt-4o" : round(output_cost_4o, 5),
+            "in-gpt-4o-mini" : round(input_cost_4o_mini, 6),
+            "out-gpt-4o-mini" : round(output_cost_4o_mini , 6)
+        }
+
+    def get_embed_cost(self) -> float:
+        embed_cost = 0.000020 * self.embed_tokens / 1000
+        return round(embed_cost, 6)
+
+    def get_embed_cache_stats(self) -> dict[str : int]:
+        return {
+            "hits" : self.embed_cache_hits,
+            "misses" : self.embed_cache_misses
+        }
+
 class ChatModel:
     debug : bool = False
     client : OpenAI = OpenAI()
+    token_limit : int = 128000
     logger = logging.getLogger(__name__)
-    total_prompt_tokens : dict[str : int]
-    total_completion_tokens : dict[str : int]
+    token_usage : TokenUsage
     logs_folder_path : str = os.environ["LOGS_FOLDER_PATH"]
 
     def __init__(self) -> None:
-        self.total_prompt_tokens = {
-            "gpt-4o-mini" : 0, "gpt-4o" : 0
-        }
-        self.total_completion_tokens = {
-            "gpt-4o-mini" : 0, "gpt-4o" : 0
-        }
+        self.token_usage = TokenUsage()
         os.makedirs(self.logs_folder_path, exist_ok = True)
         logging.basicConfig(
             level = logging.INFO,
@@ -315,57 +570,126 @@ class ChatModel:
             messages : Messages,
             tools : Tools = None,
             model : Literal["gpt-4o-mini", "gpt-4o"] = "gpt-4o-mini",
-            record_response : bool = True
+            record_response : bool = True,
+            token_usage : TokenUsage = None
             ) -> str:
         
-        self.__check_token_limit(messages = messages)
+        self._check_token_limit(messages = messages, tools = tools)
         raw_response = self.__call_api(messages = messages, tools = tools, model = model)
-        finish_reason = self.__check_finish_reason(raw_response = raw_response)
-
-        if self.debug:
-            self.logger.debug(messages.get_latest_convo_message())
-        else:
-            self.logger.info(messages.get_latest_convo_message())
+        finish_reason = self._check_finish_reason(raw_response = raw_response)
+        self._log(messages.get_latest_convo_message())
 
         if finish_reason == "stop":
-            content = self.__handle_stop_response(
+            return self._handle_stop_response(
                 messages = messages,
                 model = model,
                 raw_response = raw_response,
-                record_response = record_response
+                record_response = record_response,
+                token_usage = token_usage
             )
-            if self.debug:
-                self.logger.debug(content)
-                self.logger.debug(messages)
-            else:
-                self.logger.info(content)
-                self.logger.info(messages)
-            return content
     
         if finish_reason == "tool_calls":
-            self.__handle_tool_calls_response(
+            tool_calls = self._get_tool_calls(raw_response = raw_response)
+            tool_responses = self._use_tools(tools = tools, tool_calls = tool_calls)
+            self._record_tool_calls(
                 messages = messages,
-                model = model,
-                raw_response = raw_response,
-                tools = tools
+                tool_calls = tool_calls,
+                tool_responses = tool_responses,
+                content = raw_response.choices[0].message.content
             )
+            self._record_token_use(raw_response = raw_response, model = model, token_usage = token_usage)
             return self.get_response(
                 messages = messages,
                 tools = tools,
-                model = model
+                model = model,
+                token_usage = token_usage
+            )
+    
+    def get_structured_response(
+            self,
+            messages : Messages,
+            schema_name : str,
+            schema : dict,
+            model : Literal["gpt-4o-mini", "gpt-4o"] = "gpt-4o-mini",
+            token_usage : TokenUsage = None
+            ) -> dict:
+        
+        self._check_token_limit(messages = messages)
+        raw_response = self.client.chat.completions.create(
+                model = model,
+                messages = messages.parse_messages(),
+                response_format = self._get_response_format(schema_name = schema_name, schema = schema)
+            )
+        return self._handle_structured_response(
+            messages = messages,
+            model = model,
+            raw_response = raw_response,
+            token_usage = token_usage
+        )
+    
+    def get_response_stream(
+            self,
+            messages : Messages,
+            tools : Tools = None,
+            model : Literal["gpt-4o-mini", "gpt-4o"] = "gpt-4o-mini",
+            record_response : bool = True,
+            token_usage : TokenUsage = None
+            ) -> Iterator[str]:
+        
+        self._check_token_limit(messages = messages, tools = tools)
+        raw_stream = self.__call_api_stream(messages = messages, tools = tools, model = model)
+        content_deltas = list()
+        tool_call_deltas = dict()
+        finish_reason, usage = None, None
+
+        for chunk in raw_stream:
+            chunk : ChatCompletionChunk
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_deltas.append(delta.content)
+                yield delta.content
+            for tool_call_delta in delta.tool_calls or list():
+                self.__merge_tool_call_delta(
+                    tool_call_deltas = tool_call_deltas,
+                    tool_call_delta = tool_call_delta
+                )
+            if chunk.choices[0].finish_reason is not None:
+                finish_reason = chunk.choices[0].finish_reason
+
+        finish_reason = self._validate_finish_reason(finish_reason = finish_reason)
+        self._log(messages.get_latest_convo_message())
+        if usage is not None:
+            self._record_usage(usage = usage, model = model, token_usage = token_usage)
+
+        if finish_reason == "stop":
+            content = "".join(content_deltas)
+            if record_response:
+                messages.record_message(content = content, role = "assistant")
+            self._log(content, messages)
+            return None
+
+        if finish_reason == "tool_calls":
+            tool_calls = self.__assemble_tool_calls(tool_call_deltas = tool_call_deltas)
+            tool_responses = self._use_tools(tools = tools, tool_calls = tool_calls)
+            self._record_tool_calls(
+                messages = messages,
+                tool_calls = tool_calls,
+                tool_responses = tool_responses,
+                content = "".join(content_deltas)
+            )
+            yield from self.get_response_stream(
+                messages = messages,
+                tools = tools,
+                model = model,
+                token_usage = token_usage
             )
     
     def get_cost(self) -> dict[str : float]:
-        input_cost_4o = 0.00250 * self.total_prompt_tokens.get("gpt-4o") / 1000
-        output_cost_4o = 0.01000 * self.total_completion_tokens.get("gpt-4o") / 1000
-        input_cost_4o_mini = 0.000150 * self.total_prompt_tokens.get("gpt-4o-mini") / 1000
-        output_cost_4o_mini = 0.000600 * self.total_completion_tokens.get("gpt-4o-mini") / 1000
-        return {
-            "in-gpt-4o" : round(input_cost_4o, 5),
-            "out-gpt-4o" : round(output_cost_4o, 5),
-            "in-gpt-4o-mini" : round(input_cost_4o_mini, 6),
-            "out-gpt-4o-mini" : round(output_cost_4o_mini , 6)
-        }
+        return self.token_usage.get_chat_cost()
     
     def enable_debug(self) -> None:
         self.debug = True
@@ -375,12 +699,21 @@ class ChatModel:
             handlers = [logging.StreamHandler()]
             )
     
-    def __check_token_limit(self, messages : Messages) -> None:
-        total_input_tokens = messages.get_total_tokens()
-        if total_input_tokens > 128000:
+    def _log(self, *contents) -> None:
+        for content in contents:
+            if self.debug:
+                self.logger.debug(content)
+            else:
+                self.logger.info(content)
+    
+    def _check_token_limit(self, messages : Messages, tools : Tools = None) -> None:
+        tools_tokens = 0 if tools is None else tools.get_token_count()
+        messages.fit_token_budget(self.token_limit - tools_tokens)
+        total_input_tokens = messages.get_total_tokens() + tools_tokens
+        if total_input_tokens > self.token_limit:
             raise TokenLimitError(
                 "Token limit exceeded. \n"
-                f"Token limit: 128000 \n"
+                f"Token limit: {self.token_limit} \n"
                 f"Tokens passed: {total_input_tokens}"
             )
     
@@ -397,8 +730,59 @@ class ChatModel:
             )
         return raw_response
     
-    def __check_finish_reason(self, raw_response : ChatCompletion) -> str | None:
+    def __call_api_stream(
+            self, 
+            messages : Messages,
+            tools : Tools | None,
+            model : str
+            ) -> Iterator[ChatCompletionChunk]:
+        raw_stream = self.client.chat.completions.create(
+                model = model,
+                messages = messages.parse_messages(),
+                tools = None if tools is None else tools.get_tools(),
+                stream = True,
+                stream_options = {"include_usage" : True}
+            )
+        return raw_stream
+    
+    def __merge_tool_call_delta(
+            self,
+            tool_call_deltas : dict[int : dict[str : list[str]]],
+            tool_call_delta : ChoiceDeltaToolCall
+            ) -> None:
+        tool_call_parts = tool_call_deltas.setdefault(
+            tool_call_delta.index, 
+            {"id" : list(), "name" : list(), "arguments" : list()}
+        )
+        if tool_call_delta.id:
+            tool_call_parts["id"].append(tool_call_delta.id)
+        if tool_call_delta.function is None:
+            return None
+        if tool_call_delta.function.name:
+            tool_call_parts["name"].append(tool_call_delta.function.name)
+        if tool_call_delta.function.arguments:
+            tool_call_parts["arguments"].append(tool_call_delta.function.arguments)
+    
+    def __assemble_tool_calls(
+            self, 
+            tool_call_deltas : dict[int : dict[str : list[str]]]
+            ) -> list[tuple[str, str, str]]:
+        if not tool_call_deltas:
+            raise UnexpectedError("Tool calls were requested but none were streamed.")
+        return [
+            (
+                "".join(tool_call_parts["id"]),
+                "".join(tool_call_parts["name"]),
+                "".join(tool_call_parts["arguments"]) or "{}"
+            )
+            for _, tool_call_parts in sorted(tool_call_deltas.items())
+        ]
+    
+    def _check_finish_reason(self, raw_response : ChatCompletion) -> str | None:
         finish_reason = raw_response.choices[0].finish_reason
+        return self._validate_finish_reason(finish_reason = finish_reason)
+    
+    def _validate_finish_reason(self, finish_reason : str | None) -> str:
         if finish_reason == "length":
             raise TokenLimitError
         if finish_reason == "content_filter":
@@ -407,88 +791,355 @@ class ChatModel:
             raise UnexpectedError
         return finish_reason
     
-    def __handle_stop_response(
+    def _handle_stop_response(
             self,  
             messages : Messages,
             model : str,
             raw_response : ChatCompletion,
-            record_response : bool
+            record_response : bool,
+            token_usage : TokenUsage = None
             ) -> str:
         content = raw_response.choices[0].message.content
         if record_response:
             messages.record_message(content = content, role = "assistant")
-        self.__record_token_use(raw_response = raw_response, model = model)
+        self._record_token_use(raw_response = raw_response, model = model, token_usage = token_usage)
+        self._log(content, messages)
         return content
     
-    def __handle_tool_calls_response(
+    def _get_response_format(self, schema_name : str, schema : dict) -> dict:
+        return {
+            "type" : "json_schema",
+            "json_schema" : {
+                "name" : schema_name,
+                "schema" : schema,
+                "strict" : True
+            }
+        }
+
+    def _handle_structured_response(
             self,
             messages : Messages,
             model : str,
             raw_response : ChatCompletion,
-            tools : Tools
+            token_usage : TokenUsage = None
+            ) -> dict:
+        self._check_finish_reason(raw_response = raw_response)
+        self._record_token_use(raw_response = raw_response, model = model, token_usage = token_usage)
+        content = raw_response.choices[0].message.content
+        self._log(messages.get_latest_convo_message(), content)
+        if content is None:
+            raise PolicyViolationError
+        return json.loads(content)
+    
+    def _get_tool_calls(self, raw_response : ChatCompletion) -> list[tuple[str, str, str]]:
+        return [
+            (tool_call.id, tool_call.function.name, tool_call.function.arguments)
+            for tool_call in raw_response.choices[0].message.tool_calls
+        ]
+    
+    def _use_tools(
+            self, 
+            tools : Tools, 
+            tool_calls : list[tuple[str, str, str]]
+            ) -> list[str]:
+        if len(tool_calls) == 1:
+            _, tool_call_name, tool_call_args_json = tool_calls[0]
+            return [tools.use_tool(tool_call_name, tool_call_args_json)]
+        concurrent_calls, serial_calls = self._split_tool_calls(tools = tools, tool_calls = tool_calls)
+        with ThreadPoolExecutor(max_workers = len(concurrent_calls) + 1) as executor:
+            serial_responses = executor.submit(
+                lambda : [tools.use_tool(tool_call[1], tool_call[2]) for tool_call in serial_calls]
+            )
+            concurrent_responses = executor.map(
+                lambda tool_call : tools.use_tool(tool_call[1], tool_call[2]),
+                concurrent_calls
+            )
+            return self._order_tool_responses(
+                tool_calls = tool_calls,
+                grouped_calls = concurrent_calls + serial_calls,
+                grouped_responses = list(concurrent_responses) + serial_responses.result()
+            )
+
+    def _split_tool_calls(
+            self, 
+            tools : Tools, 
+            tool_calls : list[tuple[str, str, str]]
+            ) -> tuple[list[tuple[str, str, str]], list[tuple[str, str, str]]]:
+        concurrent_calls = [tool_call for tool_call in tool_calls if tools.is_concurrent(tool_call[1])]
+        serial_calls = [tool_call for tool_call in tool_calls if not tools.is_concurrent(tool_call[1])]
+        return concurrent_calls, serial_calls
+
+    def _order_tool_responses(
+            self,
+            tool_calls : list[tuple[str, str, str]],
+            grouped_calls : list[tuple[str, str, str]],
+            grouped_responses : list[str]
+            ) -> list[str]:
+        responses = {
+            tool_call[0] : tool_response 
+            for tool_call, tool_response in zip(grouped_calls, grouped_responses)
+        }
+        return [responses.get(tool_call[0]) for tool_call in tool_calls]
+    
+    def _record_tool_calls(
+            self,
+            messages : Messages,
+            tool_calls : list[tuple[str, str, str]],
+            tool_responses : list[str],
+            content : str = None
+            ) -> None:
+        messages.record_tool_calls(tool_calls = tool_calls, content = content)
+        for (tool_call_id, _, _), tool_response_json in zip(tool_calls, tool_responses):
+            messages.record_tool_response(
+                tool_call_id = tool_call_id,
+                tool_response_json = tool_response_json
+            )
+
+    def _record_token_use(
+            self, 
+            raw_response : ChatCompletion, 
+            model : str,
+            token_usage : TokenUsage = None
+            ) -> None:
+        self._record_usage(usage = raw_response.usage, model = model, token_usage = token_usage)
+
+    def _record_usage(
+            self, 
+            usage : CompletionUsage, 
+            model : str, 
+            token_usage : TokenUsage = None
             ) -> None:
-        tool_call_id = raw_response.choices[0].message.tool_calls[0].id
-        tool_call_name = raw_response.choices[0].message.tool_calls[0].function.name
-        tool_call_args_json = raw_response.choices[0].message.tool_calls[0].function.arguments
-        tool_response_json = tools.use_tool(
-            func_name = tool_call_name,
-            func_args_json = tool_call_args_json
+        for usage_tracker in (self.token_usage, token_usage):
+            if usage_tracker is not None:
+                usage_tracker.record_chat_usage(model, usage.prompt_tokens, usage.completion_tokens)
+
+class AsyncChatModel(ChatModel):
+
+    async def get_response(
+            self,
+            messages : Messages,
+            tools : Tools = None,
+            model : Literal["gpt-4o-mini", "gpt-4o"] = "gpt-4o-mini",
+            record_response : bool = True,
+            token_usage : TokenUsage = None
+            ) -> str:
+        
+        self._check_token_limit(messages = messages, tools = tools)
+        raw_response = await self.__call_api(messages = messages, tools = tools, model = model)
+        finish_reason = self._check_finish_reason(raw_response = raw_response)
+        self._log(messages.get_latest_convo_message())
+
+        if finish_reason == "stop":
+            return self._handle_stop_response(
+                messages = messages,
+                model = model,
+                raw_response = raw_response,
+                record_response = record_response,
+                token_usage = token_usage
+            )
+    
+        if finish_reason == "tool_calls":
+            tool_calls = self._get_tool_calls(raw_response = raw_response)
+            tool_responses = await self.__use_tools(tools = tools, tool_calls = tool_calls)
+            self._record_tool_calls(
+                messages = messages,
+                tool_calls = tool_calls,
+                tool_responses = tool_responses,
+                content = raw_response.choices[0].message.content
+            )
+            self._record_token_use(raw_response = raw_response, model = model, token_usage = token_usage)
+            return await self.get_response(
+                messages = messages,
+                tools = tools,
+                model = model,
+                token_usage = token_usage
+            )
+    
+    async def get_structured_response(
+            self,
+            messages : Messages,
+            schema_name : str,
+            schema : dict,
+            model : Literal["gpt-4o-mini", "gpt-4o"] = "gpt-4o-mini",
+            token_usage : TokenUsage = None
+            ) -> dict:
+        
+        self._check_token_limit(messages = messages)
+        raw_response = await AsyncClientPool.get_client().chat.completions.create(
+                model = model,
+                messages = messages.parse_messages(),
+                response_format = self._get_response_format(schema_name = schema_name, schema = schema)
+            )
+        return self._handle_structured_response(
+            messages = messages,
+            model = model,
+            raw_response = raw_response,
+            token_usage = token_usage
         )
-        messages.record_tool_call(
-            tool_call_id = tool_call_id,
-            tool_call_args_json = tool_call_args_json,
-            tool_call_name = tool_call_name
+    
+    async def __use_tools(
+            self, 
+            tools : Tools, 
+            tool_calls : list[tuple[str, str, str]]
+            ) -> list[str]:
+        concurrent_calls, serial_calls = self._split_tool_calls(tools = tools, tool_calls = tool_calls)
+
+        async def use_serial_tools() -> list[str]:
+            return [
+                await tools.use_tool_async(tool_call_name, tool_call_args_json)
+                for _, tool_call_name, tool_call_args_json in serial_calls
+            ]
+
+        *concurrent_responses, serial_responses = await asyncio.gather(
+            *(
+                tools.use_tool_async(tool_call_name, tool_call_args_json)
+                for _, tool_call_name, tool_call_args_json in concurrent_calls
+            ),
+            use_serial_tools()
         )
-        messages.record_tool_response(
-            tool_call_id = tool_call_id,
-            tool_response_json = tool_response_json
+        return self._order_tool_responses(
+            tool_calls = tool_calls,
+            grouped_calls = concurrent_calls + serial_calls,
+            grouped_responses = concurrent_responses + serial_responses
         )
-        self.__record_token_use(raw_response = raw_response, model = model)
 
-    def __record_token_use(
+    async def __call_api(
             self, 
-            raw_response : ChatCompletion, 
+            messages : Messages,
+            tools : Tools | None,
             model : str
-            ) -> None:
-        prompt_tokens = raw_response.usage.prompt_tokens
-        completion_tokens = raw_response.usage.completion_tokens
-        self.total_prompt_tokens[model] += prompt_tokens
-        self.total_completion_tokens[model] += completion_tokens
+            ) -> ChatCompletion:
+        raw_response = await AsyncClientPool.get_client().chat.completions.create(
+                model = model,
+                messages = messages.parse_messages(),
+                tools = None if tools is None else tools.get_tools()
+            )
+        return raw_response
 
 class EmbeddingModel:
-    total_tokens : int
+    token_usage : TokenUsage
+    cache : EmbeddingCache | None
     client : OpenAI = OpenAI()
+    model_name : str = "text-embedding-3-small"
+    dimensions : int = 1536
+    max_input_tokens : int = 8191
+    max_batch_inputs : int = 2048
+    max_batch_tokens : int = 300000
 
-    def __init__(self) -> None:
-        self.total_tokens = 0
+    def __init__(self, cache : EmbeddingCache = None) -> None:
+        self.token_usage = TokenUsage()
+        self.cache = cache
     
-    def generate_embeddings(self, text : str) -> list[float]:
-        self.__check_token_limit(text = text)
+    def generate_embeddings(self, text : str, token_usage : TokenUsage = None) -> list[float]:
+        if self.cache is not None:
+            if (cached_vector := self.cache.get(text)) is not None:
+                self._record_cache_use(cache_hits = 1, token_usage = token_usage)
+                return cached_vector.tolist()
+            self._record_cache_use(cache_misses = 1, token_usage = token_usage)
+        self._check_token_limit(text = text)
         raw_response = self.__call_api(text = text)
-        embeddings_vector = self.__get_embeddings_vector(raw_response = raw_response)
-        self.__record_token_use(raw_response = raw_response)
+        embeddings_vector = self._get_embeddings_vector(raw_response = raw_response)
+        self._record_token_use(raw_response = raw_response, token_usage = token_usage)
+        if self.cache is not None:
+            self.cache.put(text, embeddings_vector)
         return embeddings_vector
     
+    def generate_embeddings_batch(self, texts : list[str], token_usage : TokenUsage = None) -> np.ndarray:
+        embeddings_matrix, missing_texts = self._get_cached_embeddings(texts = texts, token_usage = token_usage)
+        if missing_texts:
+            missing_matrix = self.__embed_batch(texts = missing_texts, token_usage = token_usage)
+            self._fill_missing_embeddings(
+                texts = texts,
+                embeddings_matrix = embeddings_matrix,
+                missing_texts = missing_texts,
+                missing_matrix = missing_matrix
+            )
+        return embeddings_matrix
+    
     def get_cost(self) -> float:
-        embed_cost = 0.000020 * self.total_tokens / 1000
-        return round(embed_cost, 6)
+        return self.token_usage.get_embed_cost()
     
-    def __check_token_limit(self, text : str) -> None:
-        input_token_size = TokenEncoder.get_embed_token_count(text)
-        if input_token_size > 8191:
-            raise TokenLimitError(
-                token_limit = 8191, 
-                token_count = input_token_size)
+    def get_cache_stats(self) -> dict[str : int]:
+        if self.cache is None:
+            return {"hits" : 0, "misses" : 0}
+        return self.cache.get_stats()
+    
+    def __embed_batch(self, texts : list[str], token_usage : TokenUsage = None) -> np.ndarray:
+        embeddings_matrix = np.empty((len(texts), self.dimensions), dtype = np.float32)
+        for start, end in self._get_batch_bounds(texts = texts):
+            raw_response = self.__call_api(text = texts[start:end])
+            embeddings_matrix[start:end] = self._get_embeddings_matrix(
+                raw_response = raw_response,
+                batch_size = end - start
+            )
+            self._record_token_use(raw_response = raw_response, token_usage = token_usage)
+        return embeddings_matrix
     
-    def __call_api(self, text : str) -> CreateEmbeddingResponse:
+    def __call_api(self, text : str | list[str]) -> CreateEmbeddingResponse:
         raw_response = self.client.embeddings.create(
-            model = "text-embedding-3-small",
+            model = self.model_name,
             input = text,
             encoding_format = "float"
         )
         return raw_response
     
-    def __get_embeddings_vector(self, raw_response : CreateEmbeddingResponse) -> list[float]:
+    def _get_cached_embeddings(
+            self, 
+            texts : list[str], 
+            token_usage : TokenUsage = None
+            ) -> tuple[np.ndarray, list[str]]:
+        if self.cache is None:
+            embeddings_matrix = np.empty((len(texts), self.dimensions), dtype = np.float32)
+            return embeddings_matrix, list(dict.fromkeys(texts))
+        embeddings_matrix, missing_indices = self.cache.get_many(texts)
+        self._record_cache_use(
+            cache_hits = len(texts) - len(missing_indices),
+            cache_misses = len(missing_indices),
+            token_usage = token_usage
+        )
+        missing_texts = list(dict.fromkeys(texts[index] for index in missing_indices))
+        return embeddings_matrix, missing_texts
+    
+    def _fill_missing_embeddings(
+            self,
+            texts : list[str],
+            embeddings_matrix : np.ndarray,
+            missing_texts : list[str],
+            missing_matrix : np.ndarray
+            ) -> None:
+        missing_rows = {text : row for row, text in enumerate(missing_texts)}
+        for index, text in enumerate(texts):
+            if (row := missing_rows.get(text, None)) is not None:
+                embeddings_matrix[index] = missing_matrix[row]
+        if self.cache is not None:
+            self.cache.put_many(missing_texts, missing_matrix)
+    
+    def _check_token_limit(self, text : str) -> int:
+        input_token_size = TokenEncoder.get_embed_token_count(text)
+        if input_token_size > self.max_input_tokens:
+            raise TokenLimitError(
+                "Token limit exceeded. \n"
+                f"Token limit: {self.max_input_tokens} \n"
+                f"Tokens passed: {input_token_size}"
+            )
+        return input_token_size
+    
+    def _get_batch_bounds(self, texts : list[str]) -> list[tuple[int, int]]:
+        batch_bounds = list()
+        start, batch_tokens = 0, 0
+        for end, text in enumerate(texts):
+            token_count = self._check_token_limit(text = text)
+            batch_full = end - start == self.max_batch_inputs or \
+                batch_tokens + token_count > self.max_batch_tokens
+            if batch_full:
+                batch_bounds.append((start, end))
+                start, batch_tokens = end, 0
+            batch_tokens += token_count
+        if start < len(texts):
+            batch_bounds.append((start, len(texts)))
+        return batch_bounds
+    
+    def _get_embeddings_vector(self, raw_response : CreateEmbeddingResponse) -> list[float]:
         try:
             embeddings_vector = raw_response.data[0].embedding
         except (AttributeError, IndexError):
@@ -497,5 +1148,92 @@ class EmbeddingModel:
             )
         return embeddings_vector
     
-    def __record_token_use(self, raw_response : CreateEmbeddingResponse) -> None:
-        self.total_tokens += raw_response.usage.total_tokens
+    def _get_embeddings_matrix(
+            self, 
+            raw_response : CreateEmbeddingResponse,
+            batch_size : int
+            ) -> np.ndarray:
+        try:
+            embeddings_data = sorted(raw_response.data, key = lambda x : x.index)
+            embeddings_matrix = np.array(
+                [embedding.embedding for embedding in embeddings_data],
+                dtype = np.float32
+            )
+        except (AttributeError, TypeError, ValueError):
+            raise UnexpectedError(
+                f"Unable to extract output from API response: {raw_response}"
+            )
+        if embeddings_matrix.shape != (batch_size, self.dimensions):
+            raise UnexpectedError(
+                f"Expected {batch_size} embeddings from API response, "
+                f"received {len(embeddings_data)}."
+            )
+        return embeddings_matrix
+    
+    def _record_token_use(
+            self, 
+            raw_response : CreateEmbeddingResponse, 
+            token_usage : TokenUsage = None
+            ) -> None:
+        for usage_tracker in (self.token_usage, token_usage):
+            if usage_tracker is not None:
+                usage_tracker.record_embed_usage(tokens = raw_response.usage.total_tokens)
+
+    def _record_cache_use(
+            self, 
+            cache_hits : int = 0, 
+            cache_misses : int = 0, 
+            token_usage : TokenUsage = None
+            ) -> None:
+        if token_usage is not None:
+            token_usage.record_embed_usage(cache_hits = cache_hits, cache_misses = cache_misses)
+
+class AsyncEmbeddingModel(EmbeddingModel):
+
+    async def generate_embeddings(self, text : str, token_usage : TokenUsage = None) -> list[float]:
+        if self.cache is not None:
+            if (cached_vector := self.cache.get(text)) is not None:
+                self._record_cache_use(cache_hits = 1, token_usage = token_usage)
+                return cached_vector.tolist()
+            self._record_cache_use(cache_misses = 1, token_usage = token_usage)
+        self._check_token_limit(text = text)
+        raw_response = await self.__call_api(text = text)
+        embeddings_vector = self._get_embeddings_vector(raw_response = raw_response)
+        self._record_token_use(raw_response = raw_response, token_usage = token_usage)
+        if self.cache is not None:
+            self.cache.put(text, embeddings_vector)
+        return embeddings_vector
+    
+    async def generate_embeddings_batch(self, texts : list[str], token_usage : TokenUsage = None) -> np.ndarray:
+        embeddings_matrix, missing_texts = self._get_cached_embeddings(texts = texts, token_usage = token_usage)
+        if missing_texts:
+            missing_matrix = await self.__embed_batch(texts = missing_texts, token_usage = token_usage)
+            self._fill_missing_embeddings(
+                texts = texts,
+                embeddings_matrix = embeddings_matrix,
+                missing_texts = missing_texts,
+                missing_matrix = missing_matrix
+            )
+        return embeddings_matrix
+    
+    async def __embed_batch(self, texts : list[str], token_usage : TokenUsage = None) -> np.ndarray:
+        batch_bounds = self._get_batch_bounds(texts = texts)
+        raw_responses = await asyncio.gather(
+            *(self.__call_api(text = texts[start:end]) for start, end in batch_bounds)
+        )
+        embeddings_matrix = np.empty((len(texts), self.dimensions), dtype = np.float32)
+        for (start, end), raw_response in zip(batch_bounds, raw_responses):
+            embeddings_matrix[start:end] = self._get_embeddings_matrix(
+                raw_response = raw_response,
+                batch_size = end - start
+            )
+            self._record_token_use(raw_response = raw_response, token_usage = token_usage)
+        return embeddings_matrix
+    
+    async def __call_api(self, text : str | list[str]) -> CreateEmbeddingResponse:
+        raw_response = await AsyncClientPool.get_client().embeddings.create(
+            model = self.model_name,
+            input = text,
+            encoding_format = "float"
+        )
+        return raw_response
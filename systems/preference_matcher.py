@@ -0,0 +1,358 @@
+import re
+import threading
+from weakref import WeakKeyDictionary
+from rapidfuzz import fuzz, process
+from systems.therapists import Therapists
+
+class PreferenceMatch:
+    __slots__ = ("category", "value", "confidence", "words")
+    category : str
+    value : object
+    confidence : float
+    words : frozenset[str]
+
+    def __init__(
+            self, 
+            category : str, 
+            value : object, 
+            confidence : float, 
+            words : set[str] = frozenset()
+            ) -> None:
+        self.category = category
+        self.value = value
+        self.confidence = confidence
+        self.words = frozenset(words)
+
+    def __repr__(self) -> str:
+        return f"PreferenceMatch({self.category!r}, {self.value!r}, {self.confidence:.2f})"
+
+class PreferenceMatcher:
+    therapists : Therapists
+    confidence_threshold : float
+    genders : dict[str : str]
+    languages : dict[str : str]
+    specialisations : dict[str : str]
+    patient_age_groups : dict[str : str]
+    fast_path_count : int = 0
+    fallback_count : int = 0
+    stats_lock : threading.Lock = threading.Lock()
+    matchers : WeakKeyDictionary = WeakKeyDictionary()
+    matchers_lock : threading.Lock = threading.Lock()
+
+    gender_synonyms : dict[str : tuple[str]] = {
+        "female" : ("female", "woman", "women", "lady", "ladies"),
+        "male" : ("male", "man", "men", "guy", "gentleman")
+    }
+    language_synonyms : dict[str : tuple[str]] = {
+        "mandarin" : ("chinese", "huayu"),
+        "malay" : ("bahasa",),
+        "cantonese" : ("guangdonghua",)
+    }
+    patient_age_group_synonyms : dict[str : tuple[str]] = {
+        "children and teens" : (
+            "child", "children", "kid", "kids", "teen", "teens", "teenager",
+            "teenagers", "adolescent", "adolescents", "son", "daughter", "youth"
+        ),
+        "adults" : ("adult", "adults", "myself", "grown")
+    }
+    rate_type_synonyms : dict[str : tuple[str]] = {
+        "couples" : ("couple", "couples", "partner", "spouse", "marriage", "marital"),
+        "family" : ("family", "families")
+    }
+    negation_words : set[str] = {
+        "not", "no", "don't", "dont", "doesn't", "doesnt", "without",
+        "except", "whatever", "neither", "nor"
+    }
+    price_context_pattern : re.Pattern = re.compile(
+        r"\$|\bs\$|\bsgd\b|\bdollars?\b|\bbudget\b|\bprice\b|\bcost\b|\brates?\b|\bfees?\b|\bpay\b|\bafford\b|\bcheap"
+    )
+    price_range_pattern : re.Pattern = re.compile(
+        r"(?:between\s*)?\$?\s*(\d{2,4})\s*(?:-|to|and)\s*\$?\s*(\d{2,4})"
+    )
+    price_upper_pattern : re.Pattern = re.compile(
+        r"(?:under|below|less than|cheaper than|at most|max(?:imum)?|up to|within|no more than|<)\s*(?:of\s*)?\$?\s*(\d{2,4})"
+    )
+    price_lower_pattern : re.Pattern = re.compile(
+        r"(?:over|above|more than|at least|min(?:imum)?|from|>)\s*\$?\s*(\d{2,4})"
+    )
+    relative_price_patterns : dict[str : re.Pattern] = {
+        "cheaper" : re.compile(
+            r"\bcheaper\b|\bless expensive\b|\bmore affordable\b|\blower (?:price|rate|cost|budget)"
+        ),
+        "pricier" : re.compile(
+            r"\bpricier\b|\bmore expensive\b|\bhigher (?:price|rate|cost|budget)"
+        )
+    }
+    age_pattern : re.Pattern = re.compile(
+        r"\b(\d{1,2})\s*(?:years? old|yo|y/o)\b|\b(?:i'?m|i am|aged?)\s*(\d{1,2})\b"
+    )
+    self_description_pattern : re.Pattern = re.compile(
+        r"\b(?:i'?m|i am|as)\s+(?:an?\s+)?(?:[a-z']+\s+)?"
+        r"(female|male|woman|man|lady|guy|gentleman|girl|boy|mother|father|mum|mom|dad)\b"
+    )
+    time_pattern : re.Pattern = re.compile(r"\b\d{1,2}(?::\d{2})?\s*(am|pm)\b")
+    word_pattern : re.Pattern = re.compile(r"[a-z']+")
+    fallback_words : set[str] = {
+        "mon", "monday", "tue", "tues", "tuesday", "wed", "wednesday", "thu", "thurs", "thursday",
+        "fri", "friday", "sat", "saturday", "sun", "sunday", "weekday", "weekdays", "weekend",
+        "weekends", "pm", "morning", "mornings", "afternoon", "afternoons", "evening",
+        "evenings", "night", "nights", "available", "availability", "free", "schedule", "time",
+        "times", "today", "tomorrow", "one", "two", "three", "four", "five", "six", "seven",
+        "eight", "nine", "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+        "seventeen", "eighteen", "nineteen", "twenty", "thirty", "forty", "fifty", "sixty",
+        "seventy", "eighty", "ninety", "hundred", "thousand", "k", "min", "mins", "minute",
+        "minutes", "hour", "hours"
+    }
+    filler_words : set[str] = {
+        "a", "an", "the", "and", "or", "but", "also", "too", "only", "just", "i", "am", "i'm", "im", "i'd",
+        "i've", "i'll", "we", "we're", "us", "our", "year", "years", "old", "age", "aged",
+        "me", "my", "you", "your", "it", "is", "are", "be", "can", "could", "would", "will",
+        "do", "does", "have", "has", "get", "find", "like", "want", "wants", "need", "needs",
+        "looking", "look", "prefer", "preferably", "preferred", "rather", "someone", "somebody",
+        "person", "therapist", "therapists", "counsellor", "counsellors", "counselor", "psychologist",
+        "please", "pls", "thanks", "thank", "hi", "hello", "ok", "okay", "who", "that", "which",
+        "with", "for", "to", "of", "in", "on", "at", "by", "from", "who's", "speak", "speaks",
+        "speaking", "help", "helping", "deal", "dealing", "struggling", "treat", "treats", "treating",
+        "handle", "handles", "specialises", "specializes", "specialising", "specializing", "specialist",
+        "experience", "experienced", "session", "sessions", "therapy", "counselling", "counseling",
+        "option", "options", "ones", "any", "some", "something", "good", "best", "under", "below",
+        "less", "than", "over", "above", "more", "most", "least", "between", "within", "up", "max",
+        "maximum", "minimum", "around", "about", "per", "s", "sgd", "dollar", "dollars"
+    }
+
+    def __init__(self, therapists : Therapists, confidence_threshold : float = 0.85) -> None:
+        self.therapists = therapists
+        self.confidence_threshold = confidence_threshold
+        self.genders = self.__get_vocabulary(therapists.get_therapist_genders())
+        self.languages = self.__get_vocabulary(therapists.get_therapist_languages())
+        self.specialisations = self.__get_vocabulary(therapists.get_therapist_specialisations())
+        self.patient_age_groups = self.__get_vocabulary(therapists.get_therapist_patient_age_groups())
+
+    @classmethod
+    def get_matcher(cls, therapists : Therapists) -> "PreferenceMatcher":
+        with cls.matchers_lock:
+            if (matcher := cls.matchers.get(therapists, None)) is None:
+                matcher = cls(therapists)
+                cls.matchers[therapists] = matcher
+            return matcher
+
+    @classmethod
+    def record_outcome(cls, fast_path : bool) -> None:
+        with cls.stats_lock:
+            if fast_path:
+                cls.fast_path_count += 1
+            else:
+                cls.fallback_count += 1
+
+    @classmethod
+    def get_stats(cls) -> dict[str : float]:
+        total_count = cls.fast_path_count + cls.fallback_count
+        return {
+            "fast_path" : cls.fast_path_count,
+            "fallback" : cls.fallback_count,
+            "fallback_rate" : cls.fallback_count / total_count if total_count else 0.0
+        }
+
+    def match(self, text : str) -> list[PreferenceMatch]:
+        text = text.casefold()
+        words = self.word_pattern.findall(text)
+        word_set = set(words)
+        self_described_words = {
+            self_description.group(1) 
+            for self_description in self.self_description_pattern.finditer(text)
+        }
+        matches = [
+            *self.__match_gender(word_set - self_described_words),
+            *self.__match_languages(words, word_set),
+            *self.__match_patient_age_group(text, word_set),
+            *self.__match_specialisations(text, words),
+            *self.__match_rates(text, word_set)
+        ]
+        if word_set & self.negation_words:
+            for preference_match in matches:
+                preference_match.confidence *= 0.5
+        time_words = {time_match.group(1) for time_match in self.time_pattern.finditer(text)}
+        if unmatched_words := self.__get_unmatched_words(words, matches, time_words):
+            matches.append(PreferenceMatch("unmatched", unmatched_words, 0.0))
+        return matches
+
+    def is_confident(self, matches : list[PreferenceMatch]) -> bool:
+        if not matches:
+            return False
+        categories = [preference_match.category for preference_match in matches]
+        if len(categories) != len(set(categories)):
+            return False
+        return all(
+            preference_match.confidence >= self.confidence_threshold
+            for preference_match in matches
+        )
+
+    def get_canonical_value(self, category : str, value : str) -> str:
+        vocabulary, synonyms = {
+            "gender" : (self.genders, self.gender_synonyms),
+            "languages" : (self.languages, self.language_synonyms),
+            "patient_age_group" : (self.patient_age_groups, self.patient_age_group_synonyms)
+        }.get(category, (dict(), dict()))
+        normalised_value = " ".join(value.casefold().split())
+        for option, option_synonyms in synonyms.items():
+            if option in vocabulary and normalised_value in option_synonyms:
+                return vocabulary[option]
+        return value
+
+    def __get_unmatched_words(
+            self, 
+            words : list[str], 
+            matches : list[PreferenceMatch], 
+            time_words : set[str]
+            ) -> tuple[str]:
+        matched_words = set().union(*(preference_match.words for preference_match in matches))
+        return tuple(
+            word for word in words 
+            if word not in matched_words 
+            and (word in self.fallback_words or word in time_words or word not in self.filler_words)
+        )
+
+    def __get_span_words(self, text : str, spans : list[tuple[int, int]]) -> set[str]:
+        return {
+            word for start, end in spans 
+            for word in self.word_pattern.findall(text[start:end])
+        }
+
+    def __get_vocabulary(self, options : list[str]) -> dict[str : str]:
+        return {option.casefold() : option for option in options if option is not None}
+
+    def __match_gender(self, word_set : set[str]) -> list[PreferenceMatch]:
+        matched_genders = {
+            gender for gender, synonyms in self.gender_synonyms.items()
+            if gender in self.genders and word_set.intersection(synonyms)
+        }
+        matched_genders.update(word_set.intersection(self.genders))
+        matched_words = {
+            word for gender in matched_genders
+            for word in word_set.intersection((gender, *self.gender_synonyms.get(gender, tuple())))
+        }
+        if len(matched_genders) != 1:
+            return [
+                PreferenceMatch("gender", self.genders[gender], 0.0, matched_words)
+                for gender in matched_genders
+            ]
+        return [PreferenceMatch("gender", self.genders[matched_genders.pop()], 1.0, matched_words)]
+
+    def __match_languages(self, words : list[str], word_set : set[str]) -> list[PreferenceMatch]:
+        matched_languages = dict()
+        matched_words = dict()
+        for language in self.languages:
+            synonyms = self.language_synonyms.get(language, tuple())
+            if language_words := word_set.intersection((language, *synonyms)):
+                matched_languages[language] = 1.0
+                matched_words[language] = language_words
+        if not matched_languages:
+            for word in words:
+                if len(word) < 5:
+                    continue
+                result = process.extractOne(
+                    word,
+                    self.languages.keys(),
+                    scorer = fuzz.ratio,
+                    score_cutoff = 80
+                )
+                if result is not None:
+                    language, score, _ = result
+                    matched_languages[language] = max(matched_languages.get(language, 0), score / 100)
+                    matched_words.setdefault(language, set()).add(word)
+        return [
+            PreferenceMatch("languages", self.languages[language], confidence, matched_words[language])
+            for language, confidence in matched_languages.items()
+        ]
+
+    def __match_patient_age_group(self, text : str, word_set : set[str]) -> list[PreferenceMatch]:
+        matched_age_groups = {
+            age_group for age_group, synonyms in self.patient_age_group_synonyms.items()
+            if age_group in self.patient_age_groups and word_set.intersection(synonyms)
+        }
+        matched_words = {
+            word for age_group in matched_age_groups
+            for word in word_set.intersection(self.patient_age_group_synonyms[age_group])
+        }
+        for age_match in self.age_pattern.finditer(text):
+            age = int(age_match.group(1) or age_match.group(2))
+            age_group = "children and teens" if age < 18 else "adults"
+            if age_group in self.patient_age_groups:
+                matched_age_groups.add(age_group)
+                matched_words.update(self.__get_span_words(text, [age_match.span()]))
+        confidence = 1.0 if len(matched_age_groups) == 1 else 0.0
+        return [
+            PreferenceMatch("patient_age_group", self.patient_age_groups[age_group], confidence, matched_words)
+            for age_group in matched_age_groups
+        ]
+
+    def __match_specialisations(self, text : str, words : list[str]) -> list[PreferenceMatch]:
+        normalised_text = " ".join(words)
+        matched_specialisations = [
+            specialisation for specialisation in self.specialisations
+            if specialisation in normalised_text
+        ]
+        if matched_specialisations:
+            specialisation = max(matched_specialisations, key = len)
+            return [PreferenceMatch(
+                "specialisations", 
+                self.specialisations[specialisation], 
+                1.0, 
+                self.word_pattern.findall(specialisation)
+            )]
+        result = process.extractOne(
+            normalised_text,
+            self.specialisations.keys(),
+            scorer = fuzz.partial_ratio,
+            score_cutoff = 75
+        )
+        if result is None:
+            return list()
+        specialisation, score, _ = result
+        matched_words = {
+            word for word in words 
+            if process.extractOne(word, specialisation.split(), scorer = fuzz.ratio, score_cutoff = 75)
+        }
+        return [PreferenceMatch(
+            "specialisations", 
+            self.specialisations[specialisation], 
+            score / 100 - 0.1, 
+            matched_words
+        )]
+
+    def __match_rates(self, text : str, word_set : set[str]) -> list[PreferenceMatch]:
+        if not self.price_context_pattern.search(text):
+            return self.__match_relative_rates(text)
+        lower_bound, upper_bound = None, None
+        spans = [price_context.span() for price_context in self.price_context_pattern.finditer(text)]
+        if (range_match := self.price_range_pattern.search(text)) is not None:
+            lower_bound, upper_bound = sorted(int(bound) for bound in range_match.groups())
+            spans.append(range_match.span())
+        else:
+            if (upper_match := self.price_upper_pattern.search(text)) is not None:
+                upper_bound = int(upper_match.group(1))
+                spans.append(upper_match.span())
+            if (lower_match := self.price_lower_pattern.search(text)) is not None:
+                lower_bound = int(lower_match.group(1))
+                spans.append(lower_match.span())
+        if lower_bound is None and upper_bound is None:
+            return self.__match_relative_rates(text)
+        matched_words = self.__get_span_words(text, spans)
+        rate_type = None
+        for type, synonyms in self.rate_type_synonyms.items():
+            if type_words := word_set.intersection(synonyms):
+                rate_type = type
+                matched_words.update(type_words)
+        confidence = 1.0 if "$" in text else 0.9
+        return [PreferenceMatch("rates", (rate_type, lower_bound, upper_bound), confidence, matched_words)]
+
+    def __match_relative_rates(self, text : str) -> list[PreferenceMatch]:
+        matched_directions = {
+            direction : [direction_match.span() for direction_match in pattern.finditer(text)]
+            for direction, pattern in self.relative_price_patterns.items()
+        }
+        matched_directions = {direction : spans for direction, spans in matched_directions.items() if spans}
+        if len(matched_directions) != 1:
+            return list()
+        direction, spans = matched_directions.popitem()
+        return [PreferenceMatch("relative_rates", direction, 1.0, self.__get_span_words(text, spans))]
@@ -0,0 +1,80 @@
+import os
+import logging
+import threading
+from typing import Callable
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+
+class ReloadService(FileSystemEventHandler):
+    callbacks : dict[str : Callable[[], None]]
+    debounce_seconds : float
+    observer : Observer | None
+    timers : dict[str : threading.Timer]
+    reload_locks : dict[str : threading.Lock]
+    timers_lock : threading.Lock
+    logger = logging.getLogger(__name__)
+    data_folder_path : str = os.environ["DATA_FOLDER_PATH"]
+
+    def __init__(
+            self,
+            callbacks : dict[str : Callable[[], None]],
+            debounce_seconds : float = 1.0
+            ) -> None:
+        super().__init__()
+        self.callbacks = callbacks
+        self.debounce_seconds = debounce_seconds
+        self.observer = None
+        self.timers = dict()
+        self.reload_locks = {file_name : threading.Lock() for file_name in callbacks}
+        self.timers_lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.observer is not None:
+            return None
+        os.makedirs(self.data_folder_path, exist_ok = True)
+        self.observer = Observer()
+        self.observer.daemon = True
+        self.observer.schedule(self, self.data_folder_path, recursive = False)
+        self.observer.start()
+
+    def stop(self) -> None:
+        with self.timers_lock:
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers.clear()
+        if self.observer is None:
+            return None
+        self.observer.stop()
+        self.observer.join()
+        self.observer = None
+
+    def reload(self, file_name : str) -> None:
+        with self.timers_lock:
+            self.timers.pop(file_name, None)
+        with self.reload_locks[file_name]:
+            try:
+                self.callbacks[file_name]()
+                self.logger.info(f"Reloaded {file_name}")
+            except Exception as error:
+                self.logger.exception(f"Failed to reload {file_name}, keeping previous snapshot: {error}")
+
+    def on_created(self, event : FileSystemEvent) -> None:
+        self.__schedule_reload(event.src_path)
+
+    def on_modified(self, event : FileSystemEvent) -> None:
+        self.__schedule_reload(event.src_path)
+
+    def on_moved(self, event : FileSystemEvent) -> None:
+        self.__schedule_reload(event.dest_path)
+
+    def __schedule_reload(self, path : str | bytes) -> None:
+        file_name = os.path.basename(os.fsdecode(path))
+        if file_name not in self.callbacks:
+            return None
+        with self.timers_lock:
+            if (timer := self.timers.get(file_name, None)) is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce_seconds, self.reload, args = (file_name,))
+            timer.daemon = True
+            self.timers[file_name] = timer
+            timer.start()
@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from systems.model.model import EmbeddingModel, AsyncEmbeddingModel, TokenUsage
+from faiss import IndexFlatIP, IndexIDMap
+
+class ResponseCache:
+    embedding_model : EmbeddingModel
+    async_embedding_model : AsyncEmbeddingModel | None
+    similarity_threshold : float
+    ttl_seconds : float
+    max_entries : int
+    counter : int
+    index : IndexIDMap
+    entries : OrderedDict[int : tuple[str, str, float]]
+    source_signature : tuple
+    lock : threading.Lock
+    hits : int
+    misses : int
+    data_folder_path : str = os.environ["DATA_FOLDER_PATH"]
+    source_files : tuple[str] = ("FAQs.json", "therapists.json")
+
+    def __init__(
+            self,
+            embedding_model : EmbeddingModel,
+            similarity_threshold : float = 0.92,
+            ttl_seconds : float = 3600,
+            max_entries : int = 1000,
+            async_embedding_model : AsyncEmbeddingModel = None
+            ) -> None:
+        self.embedding_model = embedding_model
+        self.async_embedding_model = async_embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.source_signature = self.get_source_signature()
+        self.__reset_index()
+
+    def lookup(
+            self, 
+            question : str, 
+            source_signature : tuple = None,
+            token_usage : TokenUsage = None
+            ) -> str | None:
+        vector = self.embedding_model.generate_embeddings(text = question, token_usage = token_usage)
+        return self.__lookup_vector(vector, source_signature)
+
+    async def alookup(
+            self, 
+            question : str, 
+            source_signature : tuple = None,
+            token_usage : TokenUsage = None
+            ) -> str | None:
+        vector = await self.async_embedding_model.generate_embeddings(text = question, token_usage = token_usage)
+        return self.__lookup_vector(vector, source_signature)
+
+    def store(
+            self, 
+            question : str, 
+            answer : str, 
+            source_signature : tuple = None,
+            token_usage : TokenUsage = None
+            ) -> None:
+        vector = self.embedding_model.generate_embeddings(text = question, token_usage = token_usage)
+        self.__store_vector(question, answer, vector, source_signature)
+
+    async def astore(
+            self, 
+            question : str, 
+            answer : str, 
+            source_signature : tuple = None,
+            token_usage : TokenUsage = None
+            ) -> None:
+        vector = await self.async_embedding_model.generate_embeddings(text = question, token_usage = token_usage)
+        self.__store_vector(question, answer, vector, source_signature)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.__reset_index()
+
+    def get_stats(self) -> dict[str : int]:
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "entries" : len(self.entries)
+        }
+
+    def get_source_signature(self) -> tuple:
+        signature = list()
+        for source_file in self.source_files:
+            source_path = os.path.join(self.data_folder_path, source_file)
+            try:
+                stat = os.stat(source_path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def __lookup_vector(self, vector : list[float], source_signature : tuple | None) -> str | None:
+        vector = self.__normalise(vector)
+        with self.lock:
+            self.__check_sources()
+            if source_signature is not None and source_signature != self.source_signature:
+                self.misses += 1
+                return None
+            if self.index.ntotal == 0:
+                self.misses += 1
+                return None
+            score_list, id_list = self.index.search(vector, k = min(4, self.index.ntotal))
+            for score, id in zip(score_list[0], id_list[0].tolist()):
+                if score < self.similarity_threshold:
+                    break
+                if (entry := self.entries.get(id, None)) is None:
+                    continue
+                if self.__is_expired(entry):
+                    self.__remove_entry(id)
+                    continue
+                self.entries.move_to_end(id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def __store_vector(
+            self, 
+            question : str, 
+            answer : str, 
+            vector : list[float], 
+            source_signature : tuple | None
+            ) -> None:
+        vector = self.__normalise(vector)
+        with self.lock:
+            self.__check_sources()
+            if source_signature is not None and source_signature != self.source_signature:
+                return None
+            self.__evict_entries()
+            self.index.add_with_ids(vector, np.array([self.counter], dtype = 'int64'))
+            self.entries[self.counter] = (question, answer, time.monotonic())
+            self.counter += 1
+
+    def __reset_index(self) -> None:
+        self.counter = 0
+        self.index = IndexIDMap(IndexFlatIP(self.embedding_model.dimensions))
+        self.entries = OrderedDict()
+
+    def __normalise(self, vector : list[float]) -> np.ndarray:
+        vector = np.array(vector, dtype = np.float32).reshape(1, -1)
+        vector /= max(np.linalg.norm(vector), 1e-12)
+        return vector
+
+    def __check_sources(self) -> None:
+        source_signature = self.get_source_signature()
+        if source_signature != self.source_signature:
+            self.source_signature = source_signature
+            self.__reset_index()
+
+    def __is_expired(self, entry : tuple[str, str, float]) -> bool:
+        return time.monotonic() - entry[2] > self.ttl_seconds
+
+    def __remove_entry(self, id : int) -> None:
+        self.entries.pop(id, None)
+        self.index.remove_ids(np.array([id], dtype = 'int64'))
+
+    def __evict_entries(self) -> None:
+        evicted_ids = [id for id, entry in self.entries.items() if self.__is_expired(entry)]
+        for id in evicted_ids:
+            self.entries.pop(id)
+        while len(self.entries) >= self.max_entries:
+            id, _ = self.entries.popitem(last = False)
+            evicted_ids.append(id)
+        if evicted_ids:
+            self.index.remove_ids(np.array(evicted_ids, dtype = 'int64'))
@@ -0,0 +1,58 @@
+import time
+from systems.cost import CostTracker
+from systems.model.model import Messages, TokenUsage
+from systems.therapists import Therapists, Preferences, PreferredTherapists
+
+class Session:
+    messages : Messages
+    preferences : Preferences
+    preferred_therapists : PreferredTherapists
+    token_usage : TokenUsage
+    cost_tracker : CostTracker
+    turn_count : int
+    last_active : float
+
+    def __init__(
+            self,
+            therapists : Therapists,
+            sys_prompt : str,
+            preferences : Preferences = None,
+            max_tokens : int = None
+            ) -> None:
+        self.messages = Messages(max_tokens = max_tokens)
+        self.messages.update_sys_prompt(sys_prompt)
+        self.preferences = Preferences() if preferences is None else preferences
+        self.preferred_therapists = PreferredTherapists(therapists, self.preferences)
+        self.token_usage = TokenUsage()
+        self.cost_tracker = CostTracker(self.token_usage)
+        self.turn_count = 0
+        self.last_active = time.monotonic()
+
+    def get_messages(self) -> Messages:
+        return self.messages
+
+    def get_preferences(self) -> Preferences:
+        return self.preferences
+
+    def get_preferred_therapists(self) -> PreferredTherapists:
+        return self.preferred_therapists
+
+    def get_token_usage(self) -> TokenUsage:
+        return self.token_usage
+
+    def get_cost_tracker(self) -> CostTracker:
+        return self.cost_tracker
+
+    def get_turn_count(self) -> int:
+        return self.turn_count
+
+    def get_last_active(self) -> float:
+        return self.last_active
+
+    def record_turn(self) -> None:
+        self.turn_count += 1
+        self.last_active = time.monotonic()
+
+    def sync_therapists(self, therapists : Therapists) -> None:
+        if therapists is not self.preferred_therapists.access_therapists():
+            self.preferred_therapists.update_therapists(therapists)
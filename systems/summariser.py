@@ -0,0 +1,83 @@
+from systems.model.model import Messages, ChatModel, AsyncChatModel, TokenUsage
+
+class Summariser:
+    chat_model : ChatModel
+    async_chat_model : AsyncChatModel | None
+    summary_threshold_tokens : int = 6000
+    retained_tokens : int = 2000
+
+    def __init__(
+            self,
+            chat_model : ChatModel,
+            async_chat_model : AsyncChatModel = None
+            ) -> None:
+        self.chat_model = chat_model
+        self.async_chat_model = async_chat_model
+
+    def main(self, messages : Messages, token_usage : TokenUsage = None) -> None:
+        if (message_count := self.__get_foldable_message_count(messages)) == 0:
+            return None
+        summary = self.chat_model.get_response(
+            messages = self.__get_summary_messages(messages, message_count),
+            model = "gpt-4o-mini",
+            record_response = False,
+            token_usage = token_usage
+        )
+        messages.fold_leading_messages(message_count, self.__format_summary(summary))
+
+    async def amain(self, messages : Messages, token_usage : TokenUsage = None) -> None:
+        if (message_count := self.__get_foldable_message_count(messages)) == 0:
+            return None
+        summary = await self.async_chat_model.get_response(
+            messages = self.__get_summary_messages(messages, message_count),
+            model = "gpt-4o-mini",
+            record_response = False,
+            token_usage = token_usage
+        )
+        messages.fold_leading_messages(message_count, self.__format_summary(summary))
+
+    def __get_foldable_message_count(self, messages : Messages) -> int:
+        if messages.get_convo_tokens() <= self.summary_threshold_tokens:
+            return 0
+        return messages.get_foldable_message_count(self.retained_tokens)
+
+    def __get_summary_messages(self, messages : Messages, message_count : int) -> Messages:
+        transcript = list()
+        if (previous_summary := messages.get_summary()) is not None:
+            transcript.append(previous_summary)
+        for index, message in enumerate(messages.get_convo_messages()):
+            if index == message_count:
+                break
+            transcript.append(self.__format_message(message))
+        summary_messages = Messages()
+        summary_messages.update_sys_prompt(self.summarise_prompt)
+        summary_messages.record_message("\n".join(transcript), "user")
+        return summary_messages
+
+    def __format_message(self, message : dict) -> str:
+        if message.get("role") == "tool":
+            return f"Tool result: {message.get('content')}"
+        if (tool_calls := message.get("tool_calls")) is not None:
+            return "\n".join(
+                f"Assistant called {tool_call['function']['name']} "
+                f"with {tool_call['function']['arguments']}"
+                for tool_call in tool_calls
+            )
+        return f"{message.get('role').capitalize()}: {message.get('content')}"
+
+    def __format_summary(self, summary : str) -> str:
+        return f"{self.summary_prefix}{summary}"
+
+    summary_prefix : str = "Summary of the earlier conversation: "
+
+    summarise_prompt : str = \
+    "You will be given the earlier part of a conversation between a user " \
+    "and Tan, a chatbot assistant from Psychology Blossom, " \
+    "possibly starting with a summary of an even earlier part. " \
+    "Write a single concise summary of it in a few sentences, " \
+    "keeping the questions the user asked, the answers and referral " \
+    "information given and the therapists that were recommended. " \
+    "Do NOT include the user's therapist preferences such as gender, " \
+    "languages, specialisations, age group, price or availability, " \
+    "as these are tracked separately. " \
+    "Return only the summary."
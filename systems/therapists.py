@@ -1,16 +1,60 @@
 import os
 import json
-import Levenshtein
-from typing import Literal, Callable
+import math
+import numpy as np
+from rapidfuzz import fuzz, process
+from typing import Literal, Callable, Iterator
+from systems.fuzzy_index import FuzzyIndex
 
 class Therapists:
     therapist_data : dict
-    therapist_map : dict = dict()
+    therapist_map : dict
+    therapist_names : list[str]
+    therapist_ids : dict[str : int]
+    all_bitmap : int
+    available_bitmap : int
+    facet_bitmaps : dict[str : dict[str : int]]
+    price_index : dict[tuple[str, str | None] : tuple[np.ndarray, np.ndarray]]
+    min_prices : dict[tuple[str, str | None] : np.ndarray]
+    fuzzy_indexes : dict[str : FuzzyIndex]
+    facet_values : dict[str : list[str]]
+    facet_matrices : dict[str : np.ndarray]
+    availability_starts : dict[str : np.ndarray]
+    availability_ends : dict[str : np.ndarray]
+    session_minutes : int = 50
+    price_tolerance : int = 50
+    near_match_cutoff : float = 80
+    near_match_facets : tuple[str] = ("specialisations",)
+    days : tuple[str] = ("mon", "tues", "wed", "thurs", "fri", "sat", "sun")
+    day_aliases : dict[str : tuple[str]] = {
+        "monday" : ("mon",),
+        "tue" : ("tues",),
+        "tuesday" : ("tues",),
+        "wednesday" : ("wed",),
+        "thu" : ("thurs",),
+        "thursday" : ("thurs",),
+        "friday" : ("fri",),
+        "saturday" : ("sat",),
+        "sunday" : ("sun",),
+        "weekday" : ("mon", "tues", "wed", "thurs", "fri"),
+        "weekdays" : ("mon", "tues", "wed", "thurs", "fri"),
+        "weekend" : ("sat", "sun"),
+        "weekends" : ("sat", "sun"),
+        "any" : ("mon", "tues", "wed", "thurs", "fri", "sat", "sun"),
+        "everyday" : ("mon", "tues", "wed", "thurs", "fri", "sat", "sun")
+    }
+    facets : tuple[str] = ("gender", "languages", "patient_age_group", "specialisations", "availability")
     data_folder_path : str = os.environ["DATA_FOLDER_PATH"]
 
     def __init__(self) -> None:
+        self.therapist_map = dict()
         self.__load_therapist_data()
         self.__load_therapist_map()
+        self.__load_therapist_bitmaps()
+        self.__load_facet_matrices()
+        self.__load_price_index()
+        self.__load_availability_index()
+        self.__load_fuzzy_indexes()
 
     def get_therapist_data(self) -> dict:
         return self.therapist_data
@@ -22,21 +66,181 @@ class Therapists:
         return list(self.therapist_map.keys())
 
     def get_therapist_genders(self) -> list[str]:
-        gender_map : dict = self.therapist_map.get("gender")
+        gender_map : dict = self.therapist_map.get("gender", dict())
         return list(gender_map.keys())
     
     def get_therapist_languages(self) -> list[str]:
-        languages_map : dict = self.therapist_map.get("languages")
+        languages_map : dict = self.therapist_map.get("languages", dict())
         return list(languages_map.keys())
 
     def get_therapist_specialisations(self) -> list[str]:
-        specialisations_map : dict = self.therapist_map.get("specialisations")
+        specialisations_map : dict = self.therapist_map.get("specialisations", dict())
         return list(specialisations_map.keys())
     
     def get_therapist_patient_age_groups(self) -> list[str]:
-        patient_age_group_map : dict = self.therapist_map.get("patient_age_group")
+        patient_age_group_map : dict = self.therapist_map.get("patient_age_group", dict())
         return list(patient_age_group_map.keys())
 
+    def get_fuzzy_index(self, field : str) -> FuzzyIndex:
+        return self.fuzzy_indexes[field]
+
+    def get_therapist_name(self, therapist_id : int) -> str:
+        return self.therapist_names[therapist_id]
+
+    def get_all_bitmap(self) -> int:
+        return self.all_bitmap
+
+    def get_facet_bitmap(self, facet : str, value : str) -> int:
+        return self.facet_bitmaps.get(facet, dict()).get(value, 0)
+
+    def get_rate_durations(self, type : str) -> list[str]:
+        return [
+            duration for rate_type, duration in self.price_index 
+            if rate_type == type and duration is not None
+        ]
+
+    def get_rates_bitmap(
+            self,
+            type : str,
+            lower_bound : int | None,
+            upper_bound : int | None,
+            duration : str | None = None,
+            candidates_bitmap : int | None = None,
+            nearest : bool = False
+            ) -> int:
+        prices, ids = self.__get_price_index(type, duration, candidates_bitmap)
+        start, end = self.__get_price_bounds(prices, lower_bound, upper_bound)
+        if start == end and nearest and prices.size:
+            nearest_price = self.__get_nearest_price(prices, start, lower_bound, upper_bound)
+            start, end = self.__get_price_bounds(prices, nearest_price, nearest_price)
+        return self.__get_ids_bitmap(ids[start:end])
+
+    def get_nearest_price(
+            self,
+            type : str,
+            lower_bound : int | None,
+            upper_bound : int | None,
+            duration : str | None = None,
+            candidates_bitmap : int | None = None
+            ) -> int | None:
+        prices, _ = self.__get_price_index(type, duration, candidates_bitmap)
+        start, end = self.__get_price_bounds(prices, lower_bound, upper_bound)
+        if start != end or not prices.size:
+            return None
+        return self.__get_nearest_price(prices, start, lower_bound, upper_bound)
+
+    def get_price_range(
+            self,
+            type : str,
+            duration : str | None = None,
+            candidates_bitmap : int | None = None
+            ) -> tuple[int, int] | None:
+        prices, _ = self.__get_price_index(type, duration, candidates_bitmap)
+        if not prices.size:
+            return None
+        return int(prices[0]), int(prices[-1])
+
+    def get_availability_bitmap(self, availability : dict[str : tuple[int, int]]) -> int:
+        return self.__get_mask_bitmap(self.get_availability_scores(availability) >= 1)
+
+    def get_availability_scores(self, availability : dict[str : tuple[int, int]]) -> np.ndarray:
+        availability_scores = np.zeros(len(self.therapist_names))
+        for day, (start_minutes, end_minutes) in availability.items():
+            if (starts := self.availability_starts.get(day, None)) is None:
+                continue
+            ends = self.availability_ends[day]
+            overlap_minutes = np.minimum(ends, end_minutes) - np.maximum(starts, start_minutes)
+            required_minutes = max(min(self.session_minutes, end_minutes - start_minutes), 1)
+            np.maximum(availability_scores, np.clip(overlap_minutes / required_minutes, 0, 1), out = availability_scores)
+        return availability_scores
+
+    def get_facet_scores(self, facet : str, value : str, near_match_credit : float = 0.0) -> np.ndarray:
+        if (facet_matrix := self.facet_matrices.get(facet, None)) is None:
+            return np.zeros(len(self.therapist_names))
+        similarities = dict()
+        if near_match_credit and facet in self.near_match_facets:
+            for _, score, index in process.extract(
+                value,
+                self.facet_values[facet],
+                scorer = fuzz.token_set_ratio,
+                score_cutoff = self.near_match_cutoff,
+                limit = None
+            ):
+                similarities[index] = near_match_credit * score / 100
+        if value in self.facet_values[facet]:
+            similarities[self.facet_values[facet].index(value)] = 1.0
+        if not similarities:
+            return np.zeros(len(self.therapist_names))
+        columns = list(similarities.keys())
+        return (facet_matrix[:, columns] * np.array(list(similarities.values()))).max(axis = 1)
+
+    def get_rates_scores(
+            self,
+            type : str,
+            lower_bound : int | None,
+            upper_bound : int | None,
+            duration : str | None = None
+            ) -> np.ndarray:
+        prices, ids = self.__get_price_index(type, duration, None)
+        lower_bound = -np.inf if lower_bound is None else lower_bound
+        upper_bound = np.inf if upper_bound is None else upper_bound
+        distances = np.maximum(np.maximum(lower_bound - prices, prices - upper_bound), 0)
+        min_distances = np.full(len(self.therapist_names), np.inf)
+        np.minimum.at(min_distances, ids, distances)
+        return np.clip(1 - min_distances / self.price_tolerance, 0, 1)
+
+    def get_available_mask(self) -> np.ndarray:
+        return self.__get_bitmap_mask(self.available_bitmap)
+
+    def parse_days(self, days : str) -> list[str] | None:
+        parsed_days = list()
+        for day in days.casefold().replace(",", " ").replace("/", " ").split():
+            if day in self.days:
+                parsed_days.append(day)
+            elif day in self.day_aliases:
+                parsed_days.extend(self.day_aliases[day])
+            elif day not in ("and", "or"):
+                return None
+        return list(dict.fromkeys(parsed_days))
+
+    def parse_time(self, time : str) -> int | None:
+        time = time.strip().replace(":", "")
+        if len(time) != 4 or not time.isdigit():
+            return None
+        hours, minutes = int(time[:2]), int(time[2:])
+        if minutes >= 60 or hours * 60 + minutes > 1440:
+            return None
+        return hours * 60 + minutes
+
+    def rank_ids(
+            self, 
+            bitmap : int, 
+            type : str | None = None, 
+            duration : str | None = None
+            ) -> list[int]:
+        available_ids = list(self.iter_ids(bitmap & self.available_bitmap))
+        unavailable_ids = list(self.iter_ids(bitmap & ~self.available_bitmap))
+        if (min_prices := self.min_prices.get((type, duration), None)) is not None:
+            available_ids.sort(key = min_prices.__getitem__)
+            unavailable_ids.sort(key = min_prices.__getitem__)
+        return available_ids + unavailable_ids
+
+    def get_facet_counts(self, bitmap : int) -> dict[str : dict[str : int]]:
+        facet_counts = dict()
+        for facet, value_bitmaps in self.facet_bitmaps.items():
+            value_counts = {
+                value : count for value, value_bitmap in value_bitmaps.items()
+                if (count := (bitmap & value_bitmap).bit_count())
+            }
+            facet_counts[facet] = value_counts
+        return facet_counts
+
+    def iter_ids(self, bitmap : int) -> Iterator[int]:
+        while bitmap:
+            lowest_bit = bitmap & -bitmap
+            yield lowest_bit.bit_length() - 1
+            bitmap ^= lowest_bit
+
     def __load_therapist_data(self) -> dict:
         therapist_data_path = os.path.join(
             self.data_folder_path,
@@ -117,170 +321,515 @@ class Therapists:
             rate_type_map[therapist_name] = rate
         self.therapist_map["rates"] = rates_map
 
+    def __load_therapist_bitmaps(self) -> None:
+        self.therapist_names = list(self.therapist_data.keys())
+        self.therapist_ids = {name : id for id, name in enumerate(self.therapist_names)}
+        self.all_bitmap = (1 << len(self.therapist_names)) - 1
+        self.available_bitmap = 0
+        for therapist_name, therapist_data in self.therapist_data.items():
+            status : dict = therapist_data.get("status") or dict()
+            if status.get("available", True):
+                self.available_bitmap |= 1 << self.therapist_ids[therapist_name]
+        self.facet_bitmaps = dict()
+        for facet in self.facets:
+            self.facet_bitmaps[facet] = {
+                value : self.__get_bitmap(therapist_names)
+                for value, therapist_names in self.therapist_map.get(facet, dict()).items()
+            }
+
+    def __load_fuzzy_indexes(self) -> None:
+        durations = {duration for _, duration in self.price_index if duration is not None}
+        self.fuzzy_indexes = {
+            "name" : FuzzyIndex(self.therapist_names),
+            "gender" : FuzzyIndex(self.get_therapist_genders()),
+            "languages" : FuzzyIndex(self.get_therapist_languages()),
+            "specialisations" : FuzzyIndex(self.get_therapist_specialisations()),
+            "patient_age_group" : FuzzyIndex(self.get_therapist_patient_age_groups()),
+            "duration" : FuzzyIndex(sorted(durations))
+        }
+
+    def __load_facet_matrices(self) -> None:
+        self.facet_values = dict()
+        self.facet_matrices = dict()
+        for facet, value_bitmaps in self.facet_bitmaps.items():
+            if facet == "availability":
+                continue
+            values = list(value_bitmaps.keys())
+            facet_matrix = np.zeros((len(self.therapist_names), len(values)), dtype = bool)
+            for index, value in enumerate(values):
+                facet_matrix[:, index] = self.__get_bitmap_mask(value_bitmaps[value])
+            self.facet_values[facet] = values
+            self.facet_matrices[facet] = facet_matrix
+
+    def __load_price_index(self) -> None:
+        self.price_index = dict()
+        self.min_prices = dict()
+        for rate_type, rate_type_map in self.therapist_map.get("rates", dict()).items():
+            type_entries = list()
+            duration_entries : dict[str : list] = dict()
+            for therapist_name, rates_dict in rate_type_map.items():
+                for duration, rate in rates_dict.items():
+                    if rate is None:
+                        continue
+                    entry = (rate, self.therapist_ids[therapist_name])
+                    type_entries.append(entry)
+                    duration_entries.setdefault(duration, list()).append(entry)
+            self.__add_price_index((rate_type, None), type_entries)
+            for duration, entries in duration_entries.items():
+                self.__add_price_index((rate_type, duration), entries)
+
+    def __add_price_index(self, key : tuple[str, str | None], entries : list[tuple[int, int]]) -> None:
+        entries.sort()
+        prices = np.array([rate for rate, _ in entries], dtype = np.float64)
+        ids = np.array([id for _, id in entries], dtype = np.int64)
+        min_prices = np.full(len(self.therapist_names), np.inf)
+        np.minimum.at(min_prices, ids, prices)
+        self.price_index[key] = (prices, ids)
+        self.min_prices[key] = min_prices
+
+    def __get_price_index(
+            self,
+            type : str,
+            duration : str | None,
+            candidates_bitmap : int | None
+            ) -> tuple[np.ndarray, np.ndarray]:
+        prices, ids = self.price_index.get(
+            (type, duration), 
+            (np.empty(0, dtype = np.float64), np.empty(0, dtype = np.int64))
+        )
+        if candidates_bitmap is not None:
+            candidates_mask = self.__get_bitmap_mask(candidates_bitmap)[ids]
+            prices, ids = prices[candidates_mask], ids[candidates_mask]
+        return prices, ids
+
+    def __get_price_bounds(
+            self,
+            prices : np.ndarray,
+            lower_bound : int | None,
+            upper_bound : int | None
+            ) -> tuple[int, int]:
+        start = 0 if lower_bound is None else int(np.searchsorted(prices, lower_bound, side = "left"))
+        end = prices.size if upper_bound is None else int(np.searchsorted(prices, upper_bound, side = "right"))
+        return start, max(start, end)
+
+    def __get_nearest_price(
+            self,
+            prices : np.ndarray,
+            position : int,
+            lower_bound : int | None,
+            upper_bound : int | None
+            ) -> int:
+        if position == 0:
+            return int(prices[0])
+        if position == prices.size:
+            return int(prices[-1])
+        if lower_bound - prices[position - 1] <= prices[position] - upper_bound:
+            return int(prices[position - 1])
+        return int(prices[position])
+
+    def __load_availability_index(self) -> None:
+        self.availability_starts = dict()
+        self.availability_ends = dict()
+        availability_map : dict = self.therapist_map.get("availability", dict())
+        for day in self.days:
+            starts = np.full(len(self.therapist_names), -1, dtype = np.int16)
+            ends = np.full(len(self.therapist_names), -1, dtype = np.int16)
+            for therapist_name, (start_time, end_time) in availability_map.get(day, dict()).items():
+                start_minutes = self.parse_time(start_time)
+                end_minutes = self.parse_time(end_time)
+                if start_minutes is None or end_minutes is None:
+                    continue
+                if end_minutes <= start_minutes:
+                    end_minutes += 1440
+                starts[self.therapist_ids[therapist_name]] = start_minutes
+                ends[self.therapist_ids[therapist_name]] = end_minutes
+            self.availability_starts[day] = starts
+            self.availability_ends[day] = ends
+
+    def __get_mask_bitmap(self, mask : np.ndarray) -> int:
+        return int.from_bytes(np.packbits(mask, bitorder = "little").tobytes(), "little")
+
+    def __get_bitmap_mask(self, bitmap : int) -> np.ndarray:
+        bitmap_bytes = bitmap.to_bytes((len(self.therapist_names) + 7) // 8, "little")
+        mask = np.unpackbits(np.frombuffer(bitmap_bytes, dtype = np.uint8), bitorder = "little")
+        return mask[:len(self.therapist_names)].astype(bool)
+
+    def __get_ids_bitmap(self, ids : np.ndarray) -> int:
+        mask = np.zeros(len(self.therapist_names), dtype = bool)
+        mask[ids] = True
+        return self.__get_mask_bitmap(mask)
+
+    def __get_bitmap(self, therapist_names : set[str] | dict[str : object]) -> int:
+        bitmap = 0
+        for therapist_name in therapist_names:
+            bitmap |= 1 << self.therapist_ids[therapist_name]
+        return bitmap
+
 class Preferences:
-    therapists : Therapists
-    preferences_dict : dict = dict()
-    rates_preferred_therapists : set | None = None
-    availability_preferred_therapists : set | None = None
+    __slots__ = (
+        "gender",
+        "languages",
+        "specialisations",
+        "patient_age_group",
+        "availability",
+        "rates"
+    )
+    gender : str | None
+    languages : str | None
+    specialisations : str | None
+    patient_age_group : str | None
+    availability : dict | None
+    rates : tuple[str, int | None, int | None, str | None] | None
 
-    def __init__(self, therapists : Therapists) -> None:
-        self.therapists = therapists
+    def __init__(
+            self,
+            gender : str = None,
+            languages : str = None,
+            specialisations : str = None,
+            patient_age_group : str = None,
+            availability : dict = None,
+            rates : tuple[str, int | None, int | None, str | None] = None
+            ) -> None:
+        self.gender = gender
+        self.languages = languages
+        self.specialisations = specialisations
+        self.patient_age_group = patient_age_group
+        self.availability = availability
+        self.rates = rates
 
-    def get_preferred_therapists(self) -> list[str]:
-        preferred_therapists_set = set(self.therapists.get_therapist_data().keys())
-        preferences_dict = self.preferences_dict
-        for key, value in preferences_dict.items():
-            refined_therapists = self.therapists.get_therapist_map()
-            refined_therapists = refined_therapists[key]
-            for nested_key in value:
-                refined_therapists = refined_therapists[nested_key]
-            preferred_therapists_set = preferred_therapists_set.intersection(refined_therapists)
-        if self.rates_preferred_therapists is not None:
-            preferred_therapists_set = preferred_therapists_set.intersection(self.rates_preferred_therapists)
-        return list(preferred_therapists_set)
+    def __repr__(self) -> str:
+        return f"Preferences({self.to_dict()})"
+
+    def __eq__(self, other : object) -> bool:
+        if not isinstance(other, Preferences):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def to_dict(self) -> dict:
+        return {
+            slot : value for slot in self.__slots__ 
+            if (value := getattr(self, slot)) is not None
+        }
+
+    @classmethod
+    def from_dict(cls, preferences_dict : dict) -> "Preferences":
+        preferences_dict = dict(preferences_dict)
+        if (rates := preferences_dict.get("rates", None)) is not None:
+            preferences_dict["rates"] = tuple(rates)
+        return cls(**preferences_dict)
+
+    def copy(self) -> "Preferences":
+        return Preferences(**self.to_dict())
+
+    def get_facet_preferences(self) -> dict[str : str]:
+        return {
+            facet : value for facet in ("gender", "languages", "specialisations", "patient_age_group")
+            if (value := getattr(self, facet)) is not None
+        }
 
     def update_gender_preferences(self, gender : str) -> None:
-        self.preferences_dict["gender"] = [gender]
+        self.gender = gender
 
     def clear_gender_preferences(self) -> None:
-        del self.preferences_dict["gender"]
+        self.gender = None
     
     def update_language_preferences(self, language : str) -> None:
-        self.preferences_dict["languages"] = [language]
+        self.languages = language
      
     def clear_language_preferences(self) -> None:
-        del self.preferences_dict["languages"]
+        self.languages = None
 
     def update_specialisation_preferences(self, specialisation : str) -> None:
-        self.preferences_dict["specialisations"] = [specialisation]
+        self.specialisations = specialisation
     
     def clear_specialisation_preferences(self) -> None:
-        del self.preferences_dict["specialisations"]
+        self.specialisations = None
 
     def update_patient_age_group_preferences(self, patient_age_group : str) -> None:
-        self.preferences_dict["patient_age_group"] = [patient_age_group]
+        self.patient_age_group = patient_age_group
     
     def clear_patient_age_group_preferences(self) -> None:
-        del self.preferences_dict["patient_age_group"]
+        self.patient_age_group = None
 
     def update_availability_preferences(self, availability : dict) -> None:
-        pass
+        self.availability = availability
 
     def clear_availability_preferences(self) -> None:
-        self.availability_preferred_therapists = None
+        self.availability = None
 
     def update_rates_preferences(
             self, 
             upper_bound : int | None, 
             lower_bound : int | None, 
-            type : str
+            type : str,
+            duration : str | None = None
             ) -> None:
-        if lower_bound is None:
-            lower_bound = 0
-        if upper_bound is None:
-            upper_bound = 999
-        therapist_rates : dict = self.therapists.get_therapist_map().get('rates')
-        therapist_rates_pair : dict = therapist_rates.get(type)
-        self.rates_preferred_therapists = set()
-        for therapist, rates_dict in therapist_rates_pair.items():
-            rates_dict : dict
-            valid_rates = [rate for rate in rates_dict.values() if rate is not None]
-            if any(lower_bound <= rate and rate <= upper_bound for rate in valid_rates): 
-                self.rates_preferred_therapists.add(therapist)
+        self.rates = (type, lower_bound, upper_bound, duration)
 
     def clear_rates_preferences(self) -> None:
-        self.rates_preferred_therapists = None
+        self.rates = None
 
 class PreferredTherapists:
     therapists : Therapists
     preferences : Preferences
+    relative_price_step : float = 0.1
+    near_match_credit : float = 0.5
+    facet_weights : dict[str : float] = {
+        "specialisations" : 3.0,
+        "patient_age_group" : 3.0,
+        "gender" : 2.0,
+        "languages" : 2.0,
+        "availability" : 2.0,
+        "rates" : 2.0
+    }
 
-    def __init__(self, therapists : Therapists):
+    def __init__(self, therapists : Therapists, preferences : Preferences = None):
+        if preferences is None:
+            preferences = Preferences()
         self.therapists = therapists
-        self.preferences = Preferences(therapists)
+        self.preferences = preferences
     
     def get_preferred_therapists(self) -> list[str]:
-        return self.preferences.get_preferred_therapists()
+        type, duration = None, None
+        if self.preferences.rates is not None:
+            type, _, _, duration = self.__get_rates()
+        ranked_ids = self.therapists.rank_ids(self.get_preferred_bitmap(), type, duration)
+        return [self.therapists.get_therapist_name(therapist_id) for therapist_id in ranked_ids]
+
+    def get_preferred_bitmap(self) -> int:
+        preferred_bitmap = self.__get_unpriced_bitmap()
+        if self.preferences.rates is not None:
+            type, lower_bound, upper_bound, duration = self.__get_rates()
+            preferred_bitmap = self.therapists.get_rates_bitmap(
+                type,
+                lower_bound,
+                upper_bound,
+                duration,
+                candidates_bitmap = preferred_bitmap,
+                nearest = True
+            )
+        return preferred_bitmap
+
+    def get_facet_counts(self) -> dict[str : dict[str : int]]:
+        return self.therapists.get_facet_counts(self.get_preferred_bitmap())
+
+    def get_closest_therapists(self, k : int = 3) -> list[dict]:
+        facet_scores = dict()
+        for facet, value in self.preferences.get_facet_preferences().items():
+            facet_scores[facet] = self.therapists.get_facet_scores(facet, value, self.near_match_credit)
+        if self.preferences.availability is not None:
+            facet_scores["availability"] = self.therapists.get_availability_scores(self.preferences.availability)
+        if self.preferences.rates is not None:
+            facet_scores["rates"] = self.therapists.get_rates_scores(*self.__get_rates())
+        if not facet_scores:
+            return list()
+        weights = np.array([self.facet_weights.get(facet, 1.0) for facet in facet_scores])
+        score_matrix = np.column_stack(list(facet_scores.values()))
+        scores = score_matrix @ weights / weights.sum()
+        ranking_scores = scores + self.therapists.get_available_mask() * 1e-6
+        k = min(k, scores.size)
+        top_ids = np.argpartition(-ranking_scores, k - 1)[:k] if k else np.empty(0, dtype = np.int64)
+        top_ids = top_ids[np.argsort(-ranking_scores[top_ids], kind = "stable")]
+        return [
+            {
+                "therapist" : self.therapists.get_therapist_name(int(therapist_id)),
+                "score" : round(float(scores[therapist_id]), 2),
+                "matches" : {
+                    facet : round(float(facet_score), 2) 
+                    for facet, facet_score in zip(facet_scores, score_matrix[therapist_id])
+                }
+            }
+            for therapist_id in top_ids
+        ]
     
     def get_therapist_info(self, therapist_name : str) -> str:
         therapist_data = self.therapists.get_therapist_data()
         therapist_info = therapist_data.get(therapist_name, None)
         if therapist_info is None:
-            closest_therapist_name = self.__sort_closest_options(
-                therapist_name, list(therapist_data.keys()))[0]
+            closest_therapist_name = self.therapists.get_fuzzy_index("name").get_closest(therapist_name)
             therapist_info = therapist_data.get(closest_therapist_name)
         return json.dumps(self.__clean_therapist_info(therapist_info))
 
     def access_therapists(self) -> Therapists:
         return self.therapists
     
+    def update_therapists(self, therapists : Therapists) -> None:
+        self.therapists = therapists
+
     def access_preferences(self) -> Preferences:
         return self.preferences
     
+    def restore_preferences(self, preferences : Preferences) -> None:
+        for slot in Preferences.__slots__:
+            setattr(self.preferences, slot, getattr(preferences, slot))
+    
     def update_preferred_gender(self, gender : str = None) -> str:
         if gender is None:
             self.preferences.clear_gender_preferences()
             return "Successfully cleared 'gender' preferences."
-        gender_options = self.therapists.get_therapist_genders()
-        if gender not in gender_options:
-            return f"ValueError: 'gender' must be one of {self.__sort_closest_options(gender, gender_options)}"
-        self.preferences.update_gender_preferences(gender)
+        gender_index = self.therapists.get_fuzzy_index("gender")
+        if (matched_gender := gender_index.lookup(gender)) is None:
+            return f"ValueError: 'gender' must be one of {gender_index.get_suggestions(gender)}"
+        self.preferences.update_gender_preferences(matched_gender)
         return "Successfully updated 'gender' preferences."
 
     def update_preferred_language(self, language : str = None) -> str:
         if language is None:
             self.preferences.clear_language_preferences()
             return "Successfully cleared 'language' preferences."
-        language_options = self.therapists.get_therapist_languages()
-        if language not in language_options:
-            return f"ValueError: 'language' must be one of {self.__sort_closest_options(language, language_options)}"
-        self.preferences.update_language_preferences(language)
+        language_index = self.therapists.get_fuzzy_index("languages")
+        if (matched_language := language_index.lookup(language)) is None:
+            return f"ValueError: 'language' must be one of {language_index.get_suggestions(language)}"
+        self.preferences.update_language_preferences(matched_language)
         return "Successfully updated 'language' preferences."
     
     def update_preferred_specialisation(self, specialisation : str = None) -> str:
         if specialisation is None:
             self.preferences.clear_specialisation_preferences()
             return "Successfully cleared 'specialisation' preferences."
-        specialisation_options = self.therapists.get_therapist_specialisations()
-        if specialisation not in specialisation_options:
-            return f"ValueError: 'specialisation' must be one of {self.__sort_closest_options(specialisation, specialisation_options)}"
-        self.preferences.update_specialisation_preferences(specialisation)
+        specialisation_index = self.therapists.get_fuzzy_index("specialisations")
+        if (matched_specialisation := specialisation_index.lookup(specialisation)) is None:
+            return f"ValueError: 'specialisation' must be one of {specialisation_index.get_suggestions(specialisation)}"
+        self.preferences.update_specialisation_preferences(matched_specialisation)
         return "Successfully updated 'specialisation' preferences."
 
     def update_preferred_patient_age_group(self, patient_age_group : str = None) -> str:
         if patient_age_group is None:
             self.preferences.clear_patient_age_group_preferences()
             return "Successfully cleared 'patient_age_group' preferences."
-        patient_age_group_options = self.therapists.get_therapist_patient_age_groups()
-        if patient_age_group not in patient_age_group_options:
-            return f"ValueError: 'patient_age_group' must be one of {self.__sort_closest_options(patient_age_group, patient_age_group_options)}"
-        self.preferences.update_patient_age_group_preferences(patient_age_group)
+        patient_age_group_index = self.therapists.get_fuzzy_index("patient_age_group")
+        if (matched_patient_age_group := patient_age_group_index.lookup(patient_age_group)) is None:
+            return f"ValueError: 'patient_age_group' must be one of {patient_age_group_index.get_suggestions(patient_age_group)}"
+        self.preferences.update_patient_age_group_preferences(matched_patient_age_group)
         return "Successfully updated 'patient_age_group' preferences."
 
+    def update_preferred_availability(
+        self,
+        days : str = None,
+        start_time : str = None,
+        end_time : str = None
+        ) -> str:
+        if days is None and start_time is None and end_time is None:
+            self.preferences.clear_availability_preferences()
+            return "Successfully cleared 'availability' preferences."
+        day_options = list(self.therapists.days) + list(self.therapists.day_aliases.keys())
+        if (parsed_days := self.therapists.parse_days(days or "any")) is None or not parsed_days:
+            return f"ValueError: 'days' must be a comma separated list of {day_options}"
+        start_minutes = self.therapists.parse_time(start_time or "0000")
+        end_minutes = self.therapists.parse_time(end_time or "2400")
+        if start_minutes is None or end_minutes is None:
+            return "ValueError: 'start_time' and 'end_time' must be 24-hour times in HHMM format, e.g. 1830."
+        if end_minutes <= start_minutes:
+            return "ValueError: 'end_time' must be later than 'start_time'."
+        self.preferences.update_availability_preferences(
+            {day : (start_minutes, end_minutes) for day in parsed_days}
+        )
+        return "Successfully updated 'availability' preferences."
+
     def update_preferred_price(
         self, 
         upper_bound : str = None, 
         lower_bound : str = None,
-        type : Literal["individual", "couples", "family"] = None
+        type : Literal["individual", "couples", "family"] = None,
+        duration : str = None
         ) -> str:
         type_options = ["individual", "couples", "family"]
         if type not in type_options:
             return f"ValueError: 'type' must be one of {type_options}. " \
                 "Please check with the user to clarify their preferred type of therapy."
-        if upper_bound is not None:
-            upper_bound : int = int(upper_bound)
-        if lower_bound is not None:
-            lower_bound : int = int(lower_bound)
+        duration_options = self.therapists.get_rate_durations(type)
+        if duration is not None:
+            duration_index = self.therapists.get_fuzzy_index("duration")
+            if (duration := duration_index.lookup(duration)) not in duration_options:
+                return f"ValueError: 'duration' must be one of {duration_options}"
+        try:
+            upper_bound = self.__parse_price(upper_bound)
+            lower_bound = self.__parse_price(lower_bound)
+        except ValueError:
+            return "ValueError: 'upper_bound' and 'lower_bound' must be whole numbers."
         self.preferences.update_rates_preferences(
             upper_bound = upper_bound, 
             lower_bound = lower_bound, 
-            type = type
+            type = type,
+            duration = duration
         )
-        return "Successfully updated 'rates' preferences."
+        return self.__get_rates_update_response()
+
+    def adjust_preferred_price(
+        self,
+        direction : Literal["cheaper", "pricier"] = None,
+        amount : str = None
+        ) -> str:
+        direction_options = ["cheaper", "pricier"]
+        if direction not in direction_options:
+            return f"ValueError: 'direction' must be one of {direction_options}."
+        if self.preferences.rates is None:
+            return "ValueError: there is no previous 'rates' preference to adjust. " \
+                "Please check with the user for their preferred price range instead."
+        type, lower_bound, upper_bound, duration = self.__get_rates()
+        price_range = self.therapists.get_price_range(type, duration, self.__get_unpriced_bitmap())
+        if price_range is None:
+            return f"ValueError: no therapists offer '{type}' therapy with the other preferences provided."
+        if direction == "cheaper":
+            reference = upper_bound if upper_bound is not None else price_range[1]
+        else:
+            reference = lower_bound if lower_bound is not None else price_range[0]
+        try:
+            step = self.__parse_price(amount)
+        except ValueError:
+            return "ValueError: 'amount' must be a whole number."
+        if step is None:
+            step = max(round(reference * self.relative_price_step), 1)
+        if direction == "cheaper":
+            upper_bound = reference - step
+            if lower_bound is not None and lower_bound > upper_bound:
+                lower_bound = None
+        else:
+            lower_bound = reference + step
+            if upper_bound is not None and upper_bound < lower_bound:
+                upper_bound = None
+        self.preferences.update_rates_preferences(
+            upper_bound = upper_bound,
+            lower_bound = lower_bound,
+            type = type,
+            duration = duration
+        )
+        return self.__get_rates_update_response()
+
+    def __get_rates(self) -> tuple[str, int | None, int | None, str | None]:
+        type, lower_bound, upper_bound, duration, *_ = (*self.preferences.rates, None)
+        return type, lower_bound, upper_bound, duration
 
-    def __sort_closest_options(self, choice : str, options : list[str]) -> list[str]:
-        sorted_options = sorted(options, key = lambda option: Levenshtein.distance(choice, option))
-        return sorted_options
+    def __get_unpriced_bitmap(self) -> int:
+        preferred_bitmap = self.therapists.get_all_bitmap()
+        for facet, value in self.preferences.get_facet_preferences().items():
+            preferred_bitmap &= self.therapists.get_facet_bitmap(facet, value)
+        if self.preferences.availability is not None:
+            preferred_bitmap &= self.therapists.get_availability_bitmap(self.preferences.availability)
+        return preferred_bitmap
+
+    def __parse_price(self, price : str | int | None) -> int | None:
+        if price is None:
+            return None
+        price = float(str(price).replace("$", "").replace(",", "").strip())
+        if not math.isfinite(price):
+            raise ValueError(f"price must be finite, got {price}")
+        return round(price)
+
+    def __get_rates_update_response(self) -> str:
+        type, lower_bound, upper_bound, duration = self.__get_rates()
+        nearest_price = self.therapists.get_nearest_price(
+            type,
+            lower_bound,
+            upper_bound,
+            duration,
+            candidates_bitmap = self.__get_unpriced_bitmap()
+        )
+        if nearest_price is not None:
+            return "Successfully updated 'rates' preferences. " \
+                "No therapists charge within the requested range, " \
+                f"so therapists with the closest rate of ${nearest_price} are suggested instead."
+        return "Successfully updated 'rates' preferences."
 
     def __clean_therapist_info(self, data):
         if isinstance(data, dict):
@@ -1,89 +1,258 @@
 import os
 import json
+import logging
+import threading
 import numpy as np
-from systems.model.model import EmbeddingModel
-from faiss import IndexFlatIP, IndexIDMap, read_index, write_index
+from typing import Literal
+from systems.faq_store import FaqStore
+from systems.lexical_index import LexicalIndex
+from systems.model.model import EmbeddingModel, AsyncEmbeddingModel, TokenUsage
+from faiss import (
+    METRIC_INNER_PRODUCT, Index, IndexFlatIP, IndexHNSWFlat, IndexIDMap, IndexIVFPQ, 
+    clone_index, read_index, vector_to_array, write_index
+)
 
 class VectorstoreManager:
     counter : int
-    vectorstore : IndexIDMap
+    version : int
+    vectors_version : int | None
+    vectorstore : Index
     embedding_model : EmbeddingModel
-    id_map : dict[int : tuple[str, str]] | None
+    faq_store : FaqStore
+    vectors : np.ndarray
+    lexical_index : LexicalIndex | None
+    index_type : Literal["auto", "flat", "hnsw", "ivfpq"]
+    built_index_type : str
+    snapshot_lock : threading.Lock
+    update_lock : threading.Lock
+    lexical_lock : threading.Lock
+    logger = logging.getLogger(__name__)
+    dimensions : int = EmbeddingModel.dimensions
+    k : int = 3
+    score_threshold : float = 0.4
+    candidate_multiplier : int = 3
+    rrf_k : int = 60
+    lexical_min_coverage : float = 0.8
+    lexical_candidate_coverage : float = 0.5
+    lexical_margin : float = 1.5
+    hnsw_min_entries : int = 5000
+    ivfpq_min_entries : int = 100000
+    hnsw_neighbours : int = 32
+    hnsw_ef_search : int = 64
+    ivfpq_sub_quantizers : int = 64
+    ivfpq_nprobe : int = 16
     data_folder_path : str = os.environ["DATA_FOLDER_PATH"]
-    
-    def __init__(self, embedding_model : EmbeddingModel) -> None:
-        self.__load_id_map()
-        self.__load_vectorstore()
+
+    def __init__(
+            self, 
+            embedding_model : EmbeddingModel,
+            index_type : Literal["auto", "flat", "hnsw", "ivfpq"] = "auto"
+            ) -> None:
+        self.snapshot_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.lexical_lock = threading.Lock()
+        self.index_type = index_type
+        self.__load_state()
         self.embedding_model = embedding_model
 
-    def get_context(self, query : str) -> dict[str : str]:
-        vector = self.embedding_model.generate_embeddings(text = query)
-        vector = np.array(vector).reshape(1, -1)
-        score_list, id_list = self.vectorstore.search(vector, k = 3)
-        relevant_context = self.__get_relevant_context(
-            score_list = score_list, 
-            id_list = id_list
-        )
-        return relevant_context
+    def get_context(
+            self,
+            query : str,
+            embedding_model : EmbeddingModel = None,
+            k : int = None,
+            score_threshold : float = None,
+            token_usage : TokenUsage = None
+            ) -> dict[str : str]:
+        if embedding_model is None:
+            embedding_model = self.embedding_model
+        vector = embedding_model.generate_embeddings(text = query, token_usage = token_usage)
+        return self.__search(query, vector, k, score_threshold)
+
+    async def aget_context(
+            self,
+            query : str,
+            embedding_model : AsyncEmbeddingModel,
+            k : int = None,
+            score_threshold : float = None,
+            token_usage : TokenUsage = None
+            ) -> dict[str : str]:
+        vector = await embedding_model.generate_embeddings(text = query, token_usage = token_usage)
+        return self.__search(query, vector, k, score_threshold)
+
+    def get_lexical_context(self, query : str) -> dict[str : str] | None:
+        with self.snapshot_lock:
+            faq_store, counter, lexical_index = self.faq_store, self.counter, self.lexical_index
+        lexical_index = self.__get_lexical_index(faq_store, counter, lexical_index)
+        results = lexical_index.search(query, 2)
+        if not results:
+            return None
+        top_id, top_score = results[0]
+        runner_up_score = results[1][1] if len(results) > 1 else 0.0
+        if top_score < self.lexical_margin * runner_up_score:
+            return None
+        if lexical_index.get_coverage(query, top_id) < self.lexical_min_coverage:
+            return None
+        return self.__get_relevant_context(id_list = [top_id], faq_store = faq_store)
 
     def update_vectorstore(self) -> None:
-        faq_data = self.__load_faq_data()
-        if not faq_data:
-            self.__reset_vectorstore()
+        with self.update_lock:
+            faq_data = self.__load_faq_data() or dict()
+            added_questions, removed_ids, changed_answers = self.__diff_faq_data(faq_data)
+            if not (added_questions or removed_ids or changed_answers) and self.__has_saved_state():
+                return None
+            entries = self.faq_store.get_entries()
+            for id in removed_ids:
+                entries.pop(id, None)
+            entries.update(changed_answers)
+            added_ids = np.arange(self.counter, self.counter + len(added_questions), dtype = 'int64')
+            added_vectors = self.__embed_questions(added_questions)
+            for id, (question, answer) in zip(added_ids.tolist(), added_questions.values()):
+                entries[id] = (question, answer)
+            index_type = self.__choose_index_type(len(entries))
+            if self.vectors_version is None or index_type != self.built_index_type or \
+                (removed_ids and index_type == "hnsw"):
+                entries, vectors, vectors_version = self.__compact_vectors(entries, added_ids, added_vectors)
+                counter = len(entries)
+                vectorstore = self.__build_index(index_type, vectors, np.arange(counter, dtype = 'int64'))
+            else:
+                counter, vectors_version = self.counter + len(added_questions), self.vectors_version
+                vectors = self.__append_vectors(added_vectors, counter)
+                vectorstore = clone_index(self.vectorstore)
+                if removed_ids:
+                    vectorstore.remove_ids(np.array(removed_ids, dtype = 'int64'))
+                if added_ids.size:
+                    vectorstore.add_with_ids(added_vectors, added_ids)
+            self.built_index_type, self.vectors_version = index_type, vectors_version
+            self.__swap_snapshot(vectorstore, FaqStore.from_entries(entries, counter), vectors, counter)
             self.__save_state()
-            return None
-        new_faq_questions = set(faq_data.keys())
-        self.__handle_disjoint_questions(
-            new_faq_questions = new_faq_questions,
-            faq_data = faq_data
-            )
-        self.__save_state()
 
     def reset_all(self) -> None:
         for root, _, files in os.walk(self.data_folder_path):
             for file in files:
-                if file == "FAQs.json" or file == "id_map.json":
+                if file in ("FAQs.json", "id_map.json", "vectorstore.json"):
                     os.unlink(os.path.join(root, file))
         self.update_vectorstore()
 
+    def __search(
+            self,
+            query : str,
+            vector : list[float],
+            k : int | None,
+            score_threshold : float | None
+            ) -> dict[str : str]:
+        k = self.k if k is None else k
+        score_threshold = self.score_threshold if score_threshold is None else score_threshold
+        vector = self.__normalise(np.array(vector, dtype = np.float32).reshape(1, -1))
+        with self.snapshot_lock:
+            vectorstore, faq_store, counter = self.vectorstore, self.faq_store, self.counter
+            vectors, lexical_index = self.vectors, self.lexical_index
+        lexical_index = self.__get_lexical_index(faq_store, counter, lexical_index)
+        _, id_list = vectorstore.search(vector, k = k * self.candidate_multiplier)
+        dense_ids = [id for id in id_list[0].tolist() if id >= 0]
+        dense_scores = vectors[dense_ids] @ vector[0]
+        dense_ids = [id for id, score in zip(dense_ids, dense_scores.tolist()) if score >= score_threshold]
+        lexical_ids = [
+            id for id, _ in lexical_index.search(query, k * self.candidate_multiplier)
+            if id in dense_ids or lexical_index.get_coverage(query, id) >= self.lexical_candidate_coverage
+        ]
+        fused_ids = self.__fuse_rankings([dense_ids, lexical_ids])[:k]
+        return self.__get_relevant_context(id_list = fused_ids, faq_store = faq_store)
+
     def __get_relevant_context(
-            self, 
-            score_list : np.ndarray, 
-            id_list : np.ndarray
+            self,
+            id_list : list[int],
+            faq_store : FaqStore
             ) -> dict[str : str]:
         relevant_context = dict()
-        for score, id in zip(score_list[0], id_list[0]):
-            if score >= 0.4:
-                if (ques_and_ans := self.id_map.get(str(id), None)) is None:
-                    continue
-                ques, ans = ques_and_ans
-                relevant_context[ques] = ans
+        for id in id_list:
+            if (ques_and_ans := faq_store.get(id)) is None:
+                continue
+            ques, ans = ques_and_ans
+            relevant_context[ques] = ans
         return relevant_context
 
-    def __load_id_map(self) -> dict[int : tuple[str, str]]:
-        id_map_path = os.path.join(
-            self.data_folder_path,
-            'id_map.json')
-        if os.path.isfile(id_map_path):
-            with open(id_map_path, 'r') as id_map_file:
-                id_map : dict = json.loads(id_map_file.read())
-                self.counter = id_map.pop("__counter")
-        else:
-            id_map = dict()
-            self.counter = 0
-        self.id_map = id_map
+    def __fuse_rankings(self, rankings : list[list[int]]) -> list[int]:
+        fused_scores = dict()
+        for ranking in rankings:
+            for rank, id in enumerate(ranking):
+                fused_scores[id] = fused_scores.get(id, 0.0) + 1 / (self.rrf_k + rank + 1)
+        return sorted(fused_scores, key = fused_scores.get, reverse = True)
 
-    def __load_vectorstore(self) -> IndexIDMap:
-        vectorstore_path = os.path.join(
-            self.data_folder_path,
-            'vectorstore.index'
-        )
-        if os.path.isfile(vectorstore_path):
-            self.vectorstore = read_index(vectorstore_path)
+    def __get_manifest_path(self) -> str:
+        return os.path.join(self.data_folder_path, 'vectorstore.json')
+
+    def __get_vectorstore_path(self, version : int | None) -> str:
+        if version is None:
+            return os.path.join(self.data_folder_path, 'vectorstore.index')
+        return os.path.join(self.data_folder_path, f'vectorstore.{version}.index')
+
+    def __get_faq_store_prefix(self, version : int) -> str:
+        return os.path.join(self.data_folder_path, f'faq_store.{version}')
+
+    def __get_vectors_path(self, vectors_version : int) -> str:
+        return os.path.join(self.data_folder_path, f'vectors.{vectors_version}.f32')
+
+    def __get_legacy_vectors_path(self, version : int) -> str:
+        return os.path.join(self.data_folder_path, f'vectors.{version}.npy')
+
+    def __has_saved_state(self) -> bool:
+        return os.path.isfile(self.__get_manifest_path()) and \
+            os.path.isfile(self.__get_vectorstore_path(self.version)) and \
+            self.vectors_version is not None and \
+            os.path.isfile(self.__get_vectors_path(self.vectors_version))
+
+    def __load_state(self) -> None:
+        self.__swap_snapshot(*self.__get_empty_snapshot())
+        self.built_index_type = "flat"
+        self.version = 0
+        self.vectors_version = None
+        vectors_version = None
+        try:
+            if os.path.isfile(manifest_path := self.__get_manifest_path()):
+                with open(manifest_path, 'r') as manifest_file:
+                    manifest : dict = json.loads(manifest_file.read())
+                version, counter = manifest["version"], manifest["counter"]
+                vectors_version = manifest.get("vectors_version", None)
+                built_index_type = manifest.get("index_type", "flat")
+                faq_store = FaqStore.load(self.__get_faq_store_prefix(version))
+            elif os.path.isfile(id_map_path := os.path.join(self.data_folder_path, 'id_map.json')):
+                version, counter, faq_store = self.__load_legacy_id_map(id_map_path)
+                built_index_type = "flat"
+            else:
+                return None
+            vectorstore_path = self.__get_vectorstore_path(version)
+            vectorstore = read_index(vectorstore_path)
+            if vectorstore.ntotal != len(faq_store):
+                raise ValueError(
+                    f"{vectorstore_path} holds {vectorstore.ntotal} vectors but FAQ store has {len(faq_store)} entries"
+                )
+            if vectors_version is not None:
+                vectors = self.__open_vectors(vectors_version, counter)
+            elif version is not None and os.path.isfile(vectors_path := self.__get_legacy_vectors_path(version)):
+                vectors = np.load(vectors_path, mmap_mode = "r")
+            else:
+                vectors = self.__reconstruct_vectors(vectorstore, counter)
+                ids = np.array(faq_store.get_ids(), dtype = 'int64')
+                vectorstore = self.__build_index(built_index_type, vectors[ids], ids)
+        except (OSError, KeyError, ValueError, RuntimeError) as error:
+            self.logger.warning(f"Discarding inconsistent vectorstore state, it will be rebuilt: {error}")
+            return None
+        self.__swap_snapshot(vectorstore, faq_store, vectors, counter)
+        self.built_index_type = built_index_type
+        self.version = 0 if version is None else version
+        self.vectors_version = vectors_version
+
+    def __load_legacy_id_map(self, id_map_path : str) -> tuple[int | None, int, FaqStore]:
+        with open(id_map_path, 'r') as id_map_file:
+            id_map : dict = json.loads(id_map_file.read())
+        if "__counter" in id_map:
+            counter = id_map.pop("__counter")
+            version, entries = None, id_map
         else:
-            temp_index = IndexFlatIP(1536)
-            self.vectorstore = IndexIDMap(temp_index)
-    
+            version, counter, entries = id_map["version"], id_map["counter"], id_map["entries"]
+        entries = {int(id) : tuple(ques_and_ans) for id, ques_and_ans in entries.items()}
+        return version, counter, FaqStore.from_entries(entries, counter)
+
     def __load_faq_data(self) -> dict[str : str] | None:
         faq_path = os.path.join(
             self.data_folder_path,
@@ -91,59 +260,220 @@ class VectorstoreManager:
         if os.path.isfile(faq_path):
             with open(faq_path, 'r') as faqs_file:
                 return json.loads(faqs_file.read())
-    
-    def __reset_vectorstore(self) -> None:
-        self.counter = 0
-        self.vectorstore = IndexIDMap(IndexFlatIP(1536))
-        self.id_map = dict()
-
-    def __handle_disjoint_questions(self, new_faq_questions : set, faq_data : dict) -> None:
-        self.__delete_old_questions(new_faq_questions = new_faq_questions, faq_data = faq_data)
-        self.__add_new_questions(new_faq_questions = new_faq_questions, faq_data = faq_data)
-
-    def __delete_old_questions(self, new_faq_questions : set, faq_data : dict) -> set:
-        ids_to_remove = list()
-        for key, value in self.id_map.items():
-            try:
-                new_faq_questions.remove(value[0])
-                self.id_map[key] = (value[0], faq_data.get(value[0]))
-            except KeyError:
-                id = np.array([key], dtype = 'int64')
-                self.vectorstore.remove_ids(id)
-                ids_to_remove.append(key)
-            #except TypeError:
-            #    continue
-        for key in ids_to_remove:
-            self.id_map.pop(key)
-        return new_faq_questions
-    
-    def __add_new_questions(self, new_faq_questions : set, faq_data : dict) -> None:
-        for question in new_faq_questions:
-            self.id_map[self.counter] = (question, faq_data.get(question))
-            vector = self.embedding_model.generate_embeddings(text = question)
-            vector = np.array(vector).reshape(1, -1)
-            self.vectorstore.add_with_ids(vector, self.counter)
-            self.counter += 1
+
+    def __get_empty_snapshot(self) -> tuple[Index, FaqStore, np.ndarray, int]:
+        return (
+            IndexIDMap(IndexFlatIP(self.dimensions)), 
+            FaqStore.get_empty(), 
+            np.zeros((0, self.dimensions), dtype = np.float32), 
+            0
+        )
+
+    def __normalise(self, vectors : np.ndarray) -> np.ndarray:
+        vectors = np.ascontiguousarray(vectors, dtype = np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis = 1, keepdims = True), 1e-12)
+
+    def __reconstruct_vectors(self, vectorstore : IndexIDMap, counter : int) -> np.ndarray:
+        vectors = np.zeros((counter, self.dimensions), dtype = np.float32)
+        if vectorstore.ntotal:
+            ids = vector_to_array(vectorstore.id_map)
+            vectors[ids] = self.__normalise(vectorstore.index.reconstruct_n(0, vectorstore.ntotal))
+        return vectors
+
+    def __embed_questions(self, added_questions : dict[bytes : tuple[str, str]]) -> np.ndarray:
+        if not added_questions:
+            return np.zeros((0, self.dimensions), dtype = np.float32)
+        questions = [question for question, _ in added_questions.values()]
+        return self.__normalise(self.embedding_model.generate_embeddings_batch(texts = questions))
+
+    def __compact_vectors(
+            self,
+            entries : dict[int : tuple[str, str]],
+            added_ids : np.ndarray,
+            added_vectors : np.ndarray
+            ) -> tuple[dict[int : tuple[str, str]], np.ndarray, int]:
+        kept_ids = np.array(sorted(id for id in entries if id < self.counter), dtype = 'int64')
+        vectors_version = self.version + 1
+        vectors_path = self.__get_vectors_path(vectors_version)
+        temp_vectors_path = f"{vectors_path}.tmp"
+        with open(temp_vectors_path, 'wb') as vectors_file:
+            vectors_file.write(np.ascontiguousarray(self.vectors[kept_ids], dtype = np.float32).tobytes())
+            vectors_file.write(added_vectors.tobytes())
+            vectors_file.flush()
+            os.fsync(vectors_file.fileno())
+        os.replace(temp_vectors_path, vectors_path)
+        compacted_entries = {
+            new_id : entries[id] 
+            for new_id, id in enumerate((*kept_ids.tolist(), *added_ids.tolist()))
+        }
+        return compacted_entries, self.__open_vectors(vectors_version, len(compacted_entries)), vectors_version
+
+    def __append_vectors(self, added_vectors : np.ndarray, counter : int) -> np.ndarray:
+        if not added_vectors.size:
+            return self.vectors
+        row_size = self.dimensions * np.dtype(np.float32).itemsize
+        with open(self.__get_vectors_path(self.vectors_version), 'r+b') as vectors_file:
+            vectors_file.truncate(self.counter * row_size)
+            vectors_file.seek(self.counter * row_size)
+            vectors_file.write(added_vectors.tobytes())
+            vectors_file.flush()
+            os.fsync(vectors_file.fileno())
+        return self.__open_vectors(self.vectors_version, counter)
+
+    def __open_vectors(self, vectors_version : int, counter : int) -> np.ndarray:
+        if not counter:
+            return np.zeros((0, self.dimensions), dtype = np.float32)
+        return np.memmap(
+            self.__get_vectors_path(vectors_version), 
+            dtype = np.float32, 
+            mode = "r", 
+            shape = (counter, self.dimensions)
+        )
+
+    def __choose_index_type(self, entry_count : int) -> str:
+        if self.index_type != "auto":
+            return self.index_type
+        if entry_count >= self.ivfpq_min_entries:
+            return "ivfpq"
+        if entry_count >= self.hnsw_min_entries:
+            return "hnsw"
+        return "flat"
+
+    def __build_index(self, index_type : str, vectors : np.ndarray, ids : np.ndarray) -> Index:
+        if index_type == "hnsw":
+            hnsw_index = IndexHNSWFlat(self.dimensions, self.hnsw_neighbours, METRIC_INNER_PRODUCT)
+            hnsw_index.hnsw.efSearch = self.hnsw_ef_search
+            vectorstore = IndexIDMap(hnsw_index)
+        elif index_type == "ivfpq":
+            nlist = max(1, min(int(4 * np.sqrt(len(vectors))), len(vectors) // 39))
+            vectorstore = IndexIVFPQ(
+                IndexFlatIP(self.dimensions), 
+                self.dimensions, 
+                nlist, 
+                self.ivfpq_sub_quantizers, 
+                8, 
+                METRIC_INNER_PRODUCT
+            )
+            vectorstore.train(vectors)
+            vectorstore.nprobe = self.ivfpq_nprobe
+        else:
+            vectorstore = IndexIDMap(IndexFlatIP(self.dimensions))
+        if ids.size:
+            vectorstore.add_with_ids(vectors, ids)
+        return vectorstore
+
+    def __swap_snapshot(
+            self,
+            vectorstore : Index,
+            faq_store : FaqStore,
+            vectors : np.ndarray,
+            counter : int,
+            lexical_index : LexicalIndex = None
+            ) -> None:
+        with self.snapshot_lock:
+            self.vectorstore, self.faq_store = vectorstore, faq_store
+            self.vectors, self.counter = vectors, counter
+            self.lexical_index = lexical_index
+
+    def __get_lexical_index(
+            self,
+            faq_store : FaqStore,
+            counter : int,
+            lexical_index : LexicalIndex | None
+            ) -> LexicalIndex:
+        if lexical_index is not None:
+            return lexical_index
+        with self.lexical_lock:
+            with self.snapshot_lock:
+                if self.faq_store is faq_store and self.lexical_index is not None:
+                    return self.lexical_index
+            lexical_index = LexicalIndex(
+                {id : f"{ques} {ans}" for id, (ques, ans) in faq_store.get_entries().items()},
+                counter
+            )
+            with self.snapshot_lock:
+                if self.faq_store is faq_store:
+                    self.lexical_index = lexical_index
+        return lexical_index
+
+    def __get_journal(self) -> dict[bytes : tuple[int, bytes]]:
+        journal = dict()
+        for id in self.faq_store.get_ids():
+            question_hash, answer_hash = self.faq_store.get_hashes(id)
+            journal[question_hash] = (id, answer_hash)
+        return journal
+
+    def __diff_faq_data(
+            self,
+            faq_data : dict[str : str]
+            ) -> tuple[dict[bytes : tuple[str, str]], list[int], dict[int : tuple[str, str]]]:
+        journal = self.__get_journal()
+        added_questions = dict()
+        changed_answers = dict()
+        for question, answer in faq_data.items():
+            question_hash = FaqStore.get_hash(question)
+            if (entry := journal.pop(question_hash, None)) is None:
+                added_questions[question_hash] = (question, answer)
+                continue
+            id, answer_hash = entry
+            if answer_hash != FaqStore.get_hash(answer):
+                changed_answers[id] = (question, answer)
+        removed_ids = [id for id, _ in journal.values()]
+        return added_questions, removed_ids, changed_answers
 
     def __save_state(self) -> None:
-        self.__save_vectorstore()
-        self.__save_id_map()
-        
-    def __save_vectorstore(self) -> None:
-        vectorstore_path = os.path.join(
-            self.data_folder_path,
-            'vectorstore.index')
-        write_index(self.vectorstore, vectorstore_path)
-    
-    def __save_id_map(self) -> None:
-        id_map_path = os.path.join(
-            self.data_folder_path,
-            'id_map.json'
+        version = self.version + 1
+        faq_store_prefix = self.__get_faq_store_prefix(version)
+        self.__save_vectorstore(self.__get_vectorstore_path(version))
+        self.faq_store.save(faq_store_prefix)
+        self.__save_manifest(version)
+        self.version = version
+        self.__swap_snapshot(
+            self.vectorstore, 
+            FaqStore.load(faq_store_prefix), 
+            self.vectors,
+            self.counter,
+            self.lexical_index
         )
-        self.id_map["__counter"] = self.counter
-        with open(id_map_path, 'w') as id_map_file:
+        self.__remove_stale_files(version)
+
+    def __save_vectorstore(self, vectorstore_path : str) -> None:
+        temp_vectorstore_path = f"{vectorstore_path}.tmp"
+        write_index(self.vectorstore, temp_vectorstore_path)
+        os.replace(temp_vectorstore_path, vectorstore_path)
+
+    def __save_manifest(self, version : int) -> None:
+        manifest_path = self.__get_manifest_path()
+        temp_manifest_path = f"{manifest_path}.tmp"
+        with open(temp_manifest_path, 'w') as manifest_file:
             json.dump(
-                self.id_map,
-                id_map_file,
-                indent = 4
+                {
+                    "version" : version, 
+                    "counter" : self.counter, 
+                    "vectors_version" : self.vectors_version,
+                    "index_type" : self.built_index_type
+                }, 
+                manifest_file
             )
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(temp_manifest_path, manifest_path)
+
+    def __remove_stale_files(self, version : int) -> None:
+        current_files = (
+            os.path.basename(self.__get_vectorstore_path(version)),
+            os.path.basename(self.__get_vectors_path(self.vectors_version)),
+            f"{os.path.basename(self.__get_faq_store_prefix(version))}."
+        )
+        for file in os.listdir(self.data_folder_path):
+            is_stale = file == "id_map.json" or (
+                file.startswith(("vectorstore.", "vectors.", "faq_store.")) and \
+                file.endswith((".index", ".npy", ".f32", ".blob")) and \
+                not file.startswith(current_files)
+            )
+            if not is_stale:
+                continue
+            try:
+                os.unlink(os.path.join(self.data_folder_path, file))
+            except OSError:
+                continue